@@ -1,134 +1,82 @@
-from googleapiclient.discovery import build
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from collections import Counter
-import pandas as pd
-from langchain_community.llms import Ollama
+"""
+Command line for the YouTube comment collector; the search, fetch, summarize and export
+code lives in `datacollection.youtube_comments` and can be imported on its own
+"""
+import typer
+
+from datacollection import llm, quota, youtube_api, youtube_comments
+from datacollection.search_index import SearchIndex, update_from_exports
+
+
+def main(
+        keyword: str = typer.Option(..., prompt="Enter Search Keyword", help="Search keyword"),
+        videos: int = typer.Option(..., prompt="Enter Number of Videos", help="Number of videos to collect"),
+        remove_duplicates: bool = typer.Option(True, prompt="Do You Want to Remove Duplicate Videos?",
+                                               help="Drop search hits with the same videoId"),
+        api_key: str = typer.Option("", envvar="YOUTUBE_API_KEY", help="YouTube Data API key"),
+        output_dir: str = typer.Option(youtube_comments.EXPORT_DIR, help="Folder for the CSV/Parquet tables"),
+        excel_file: str = typer.Option(youtube_comments.EXCEL_FILE, help="Excel workbook with every exported row (empty to skip)"),
+        parquet: bool = typer.Option(False, help="Also write chunked Parquet files (requires pyarrow)"),
+        workers: int = typer.Option(youtube_comments.FETCH_WORKERS,
+                                    help="Videos whose comments are fetched at the same time"),
+        llm_workers: int = typer.Option(youtube_comments.LLM_WORKERS, help="Videos summarized at the same time"),
+        incremental: bool = typer.Option(False, help="Revisit collected videos and only fetch their new comments"),
+        http_cache: str = typer.Option("http_cache.sqlite",
+                                       help="On-disk cache of API responses, revalidated with ETags (empty to disable)"),
+        offline: bool = typer.Option(False, help="Only use responses already in the HTTP cache"),
+        daily_quota: int = typer.Option(quota.DAILY_QUOTA, help="YouTube API units to spend per day "
+                                                                "(shared by all runs, 0 for no limit)"),
+        priority: str = typer.Option("comments", help="Fetch the videos with the most comments or views first "
+                                                      "(comments or views)"),
+        wait_for_quota: bool = typer.Option(False, help="When the quota runs out, wait for the reset and resume"),
+        search_index: str = typer.Option("search_index.sqlite",
+                                         help="Full-text index updated with the new rows after the run (empty to skip)"),
+        dry_run: bool = typer.Option(False, help="Print what would be collected without calling any API"),
+):
+    if dry_run:
+        search_pages = -(-videos // youtube_api.SEARCH_PAGE_SIZE)
+        print(f"Keyword: {keyword!r}, up to {videos} videos")
+        print(f"Search: {search_pages} pages, {search_pages * youtube_api.QUOTA_COSTS['youtube.search.list']} "
+              f"quota units (plus one unit per comment page)")
+        print(f"LLM servers: {llm.base_urls()}")
+        print(f"HTTP cache: {http_cache or 'disabled'}" + (" (offline)" if offline else ""))
+        print(f"Output: {output_dir}, {excel_file}")
+        print("Mode: " + ("incremental (new comments of collected videos)" if incremental else
+                          "skip collected videos"))
+        if daily_quota and not offline:
+            budget = quota.QuotaBudget("quota.sqlite", daily_quota)
+            job = budget.load_job(youtube_comments.COLLECTED_KIND, keyword)
+            print(f"Quota: {budget.remaining()} of {daily_quota} units left today, videos ranked by {priority}"
+                  + (f", resuming a paused sweep with {len(job)} videos left" if job is not None else ""))
+            budget.close()
+        return
+
+    if priority not in youtube_comments.PRIORITIES:
+        raise typer.BadParameter(f"expected one of {', '.join(youtube_comments.PRIORITIES)}", param_hint="--priority")
+    if http_cache or offline:
+        youtube_api.configure_http_cache(http_cache or "http_cache.sqlite", offline=offline)
+    # Offline runs never reach the API, so they need no budget
+    budget = youtube_api.configure_quota("quota.sqlite", daily_quota) if daily_quota and not offline else None
 
-llm = Ollama(base_url="http://131.123.41.132:11434", model="llava:34b")
-
-
-def get_youtube_videos_by_keyword(api_key, keyword, max_results):
-    youtube = build('youtube', 'v3', developerKey=api_key)
-    search_response = youtube.search().list(
-        q=keyword,
-        part='id,snippet',
-        maxResults=max_results
-    ).execute()
-
-    videos = []
-    for item in search_response.get('items', []):
-        if item['id']['kind'] == 'youtube#video':
-            video_data = {
-                'title': item['snippet']['title'],
-                'videoId': item['id']['videoId'],
-                'description': item['snippet']['description'],
-                'channelTitle': item['snippet']['channelTitle'],
-                'publishedAt': item['snippet']['publishedAt']
-            }
-            videos.append(video_data)
-
-    return videos
-
-def get_video_details(youtube, video_id):
-    request = youtube.videos().list(part="snippet", id=video_id)
-    response = request.execute()
-    return response['items'][0]['snippet']
-
-def extract_keywords(text, num_keywords=12):
-    words = word_tokenize(text)
-    words = [word.lower() for word in words]
-    stop_words = set(stopwords.words('english'))
-    words = [word for word in words if word.isalnum() and word not in stop_words]
-    most_common = Counter(words).most_common(num_keywords)
-    keywords = [word for word, _ in most_common]
-    return keywords
-
-def get_video_keywords(youtube, video_id):
-    details = get_video_details(youtube, video_id)
-    title = details['title']
-    description = details['description']
-    text = title + ' ' + description
-    keywords = extract_keywords(text)
-    return keywords
-
-
-def fetch_comments (video_id):
-    comments = []
-    request = youtube.commentThreads().list(
-        part="snippet",
-        videoId=video_id,
-        maxResults=100  # Set the maximum results per page
-    )
-    while request:
-        response = request.execute()
-        for item in response['items']:
-            comment = item['snippet']['topLevelComment']['snippet']['textDisplay']
-            comments.append(comment)
-        request = youtube.commentThreads().list_next(request, response)  # Use the nextPageToken for pagination
-    return comments
-
-
-def summarize_comments(comments):
-    # Get the transcript text
-    all_comments = "\n".join(comments)
-    # You can update the prompt to whatever you want
-    summary_text = llm.invoke(f"""
-                summarize the following comments without losing any important points or opinions:
-                "{all_comments}".
-                """)
-    return summary_text
-
-def remove_duplicates(video):
-    new = []
-    [new.append(x) for x in video if x not in new]
-    return new
-
-# Main logic
-api_key = ''  # Replace with your actual YouTube API key
-keyword = input("Enter Search Keyword: ")
-num_Videos = input("Enter Number of Videos: ")
-duplicates = input("Do You Want to Remove Duplicate Videos? (Y/N) ")
-videos = get_youtube_videos_by_keyword(api_key, keyword, num_Videos)
-count = 1
-if duplicates == "Y":
-    videos = remove_duplicates(videos)
-
-
-# nltk.download('punkt')
-# nltk.download('stopwords')
-
-youtube = build('youtube', 'v3', developerKey=api_key)
-
-excel_file = "Comment Archive.xlsx"
-all_data = []
-
-for video in videos:
     try:
-        video_url = "https://www.youtube.com/watch?v=" + video['videoId']
-        print(video_url)
-        print("Videos Processed: " + str(count))
-        count += 1
-        print("Videos Remaining: " + str(len(videos) - count))
-        comments = fetch_comments(video['videoId'])
-        comment_summary = summarize_comments(comments)
-
-        for comment in comments:
-            all_data.append({
-                'Title': video['title'],
-                'URL': video_url,
-                'Comments': comment,
-                'Comment Summary': comment_summary
-            })
-
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        continue
-
-# Create a DataFrame with all data
-final_df = pd.DataFrame(all_data)
-
-# Export to Excel
-final_df.to_excel(excel_file, index=False)
-print(f'Video information exported to {excel_file}')
+        while True:
+            left = youtube_comments.collect_comments(keyword, videos, api_key=api_key, dedupe=remove_duplicates,
+                                                     export_dir=output_dir, excel_file=excel_file,
+                                                     export_formats=("csv", "parquet") if parquet else ("csv",),
+                                                     fetch_workers=workers, llm_workers=llm_workers,
+                                                     incremental=incremental, priority=priority)
+            if not left or not wait_for_quota or budget is None:
+                break
+            budget.wait_for_reset()
+    finally:
+        youtube_api.close_quota()
+        youtube_api.close_http_cache()
+
+    if search_index:
+        index = SearchIndex(search_index)
+        print(f"Indexed {update_from_exports(index, comment_dir=output_dir)} new documents in {search_index}")
+        index.close()
+
+
+if __name__ == "__main__":
+    typer.run(main)
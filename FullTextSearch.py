@@ -0,0 +1,75 @@
+"""
+Command line for the full-text index: load the exported comment, transcript, summary and
+Reddit tables into SQLite FTS5 (`datacollection.search_index`) and query it
+"""
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import typer
+
+from datacollection.search_index import SearchIndex, parse_time, update_from_exports
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def update(
+        index_path: str = typer.Option("search_index.sqlite", help="Where the full-text index is stored"),
+        comment_dir: str = typer.Option("Comment Archive", help="Output folder of CommentCollection.py"),
+        transcript_dir: str = typer.Option("Transcript Record", help="Output folder of TranscriptCollection.py"),
+        reddit_dir: str = typer.Option("./data", help="Output folder of RedditCollection.py"),
+        optimize: bool = typer.Option(False, help="Merge the index into one segment afterwards (faster queries)"),
+):
+    """
+    Add the rows exported since the last update to the index
+    """
+    index = SearchIndex(index_path)
+    added = update_from_exports(index, comment_dir, transcript_dir, reddit_dir)
+    if optimize:
+        index.optimize()
+    print(f"Indexed {added} new documents ({len(index)} documents)")
+    for source, count in sorted(index.counts().items()):
+        print(f"  {source}: {count}")
+    index.close()
+
+
+@app.command()
+def query(
+        text: str = typer.Argument(..., help='FTS5 query: words, "a phrase", prefix*, AND/OR/NOT, NEAR(a b)'),
+        source: Optional[str] = typer.Option(None, help="Only this table, e.g. youtube_comments, "
+                                                        "youtube_transcript_summaries, reddit_submissions"),
+        scope: Optional[str] = typer.Option(None, help="Only this video URL or subreddit"),
+        since: Optional[str] = typer.Option(None, help="Only documents created at or after this date (YYYY-MM-DD)"),
+        until: Optional[str] = typer.Option(None, help="Only documents created before this date (YYYY-MM-DD)"),
+        limit: int = typer.Option(20, help="Number of hits"),
+        index_path: str = typer.Option("search_index.sqlite", help="Where the full-text index is stored"),
+):
+    """
+    Print the best matching documents, best match first
+    """
+    bounds = {}
+    for name, value in (("since", since), ("until", until)):
+        try:
+            bounds[name] = parse_time(value)
+        except ValueError:
+            raise typer.BadParameter(f"expected a date (YYYY-MM-DD) or ISO 8601 time, got {value!r}",
+                                     param_hint=f"--{name}")
+    index = SearchIndex(index_path)
+    start = time.perf_counter()
+    hits = index.search(text, source=source, scope=scope, limit=limit, **bounds)
+    elapsed = time.perf_counter() - start
+    for hit in hits:
+        created = f"{datetime.fromtimestamp(hit['created'], timezone.utc):%Y-%m-%d}  " if hit['created'] else ""
+        print(f"{hit['score']:6.2f}  {hit['source']}  {created}{hit['scope'] or ''}")
+        if hit['title']:
+            print(f"        {hit['title']}")
+        print(f"        {hit['snippet']}")
+        if hit['url'] and hit['url'] != hit['scope']:
+            print(f"        {hit['url']}")
+    print(f"{len(hits)} hits in {elapsed * 1000:.1f} ms")
+    index.close()
+
+
+if __name__ == "__main__":
+    app()
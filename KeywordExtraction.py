@@ -0,0 +1,49 @@
+"""
+Command line for the corpus keyword stage: index the exported comment, transcript and
+Reddit tables into a TF-IDF matrix (`datacollection.keywords`) and print the keywords
+"""
+from typing import Optional
+
+import typer
+
+from datacollection.keywords import KeywordIndex, update_from_exports
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def update(
+        index_dir: str = typer.Option("keyword_index", help="Where the term-document matrix is stored"),
+        comment_dir: str = typer.Option("Comment Archive", help="Output folder of CommentCollection.py"),
+        transcript_dir: str = typer.Option("Transcript Record", help="Output folder of TranscriptCollection.py"),
+        reddit_dir: str = typer.Option("./data", help="Output folder of RedditCollection.py"),
+):
+    """
+    Add the rows exported since the last update to the index
+    """
+    index = KeywordIndex(index_dir)
+    added = update_from_exports(index, comment_dir, transcript_dir, reddit_dir)
+    index.save()
+    print(f"Indexed {added} new documents ({len(index)} documents, {len(index.terms)} terms)")
+
+
+@app.command()
+def show(
+        by: Optional[str] = typer.Option(None, help="Group to rank keywords for: video, subreddit or source "
+                                                    "(default: the whole corpus)"),
+        top: int = typer.Option(12, help="Keywords per group"),
+        index_dir: str = typer.Option("keyword_index", help="Where the term-document matrix is stored"),
+):
+    """
+    Print the top TF-IDF keywords overall or for every video/subreddit/source
+    """
+    index = KeywordIndex(index_dir)
+    if by is None:
+        print(", ".join(term for term, _ in index.keywords(top)))
+        return
+    for label, keywords in index.keywords_by(by, top).items():
+        print(f"{label}: {', '.join(term for term, _ in keywords)}")
+
+
+if __name__ == "__main__":
+    app()
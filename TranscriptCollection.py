@@ -1,121 +1,63 @@
-from googleapiclient.discovery import build
-import pandas as pd
-from youtube_transcript_api import YouTubeTranscriptApi as yta
-from langchain_community.llms import Ollama
+"""
+Command line for the YouTube transcript collector; the search, transcript, summarize and
+export code lives in `datacollection.youtube_transcripts` and can be imported on its own
+"""
+import typer
+
+from datacollection import llm, quota, youtube_api, youtube_transcripts
+from datacollection.search_index import SearchIndex, update_from_exports
+
+
+def main(
+        keyword: str = typer.Option(..., prompt="Enter Search Keyword", help="Search keyword"),
+        videos: int = typer.Option(..., prompt="Enter Number of Videos", help="Number of videos to collect"),
+        remove_duplicates: bool = typer.Option(True, prompt="Do You Want to Remove Duplicate Videos?",
+                                               help="Drop search hits with the same videoId"),
+        api_key: str = typer.Option("", envvar="YOUTUBE_API_KEY", help="YouTube Data API key"),
+        output_dir: str = typer.Option(youtube_transcripts.EXPORT_DIR, help="Folder for the CSV/Parquet tables"),
+        excel_file: str = typer.Option(youtube_transcripts.EXCEL_FILE, help="Excel workbook with every exported row (empty to skip)"),
+        parquet: bool = typer.Option(False, help="Also write chunked Parquet files (requires pyarrow)"),
+        llm_workers: int = typer.Option(youtube_transcripts.LLM_WORKERS, help="Videos processed at the same time"),
+        transcript_workers: int = typer.Option(youtube_transcripts.TRANSCRIPT_WORKERS,
+                                               help="Transcripts downloaded at the same time"),
+        http_cache: str = typer.Option("http_cache.sqlite",
+                                       help="On-disk cache of API responses, revalidated with ETags (empty to disable)"),
+        offline: bool = typer.Option(False, help="Only use responses already in the HTTP cache"),
+        daily_quota: int = typer.Option(quota.DAILY_QUOTA, help="YouTube API units to spend per day "
+                                                                "(shared by all runs, 0 for no limit)"),
+        search_index: str = typer.Option("search_index.sqlite",
+                                         help="Full-text index updated with the new rows after the run (empty to skip)"),
+        dry_run: bool = typer.Option(False, help="Print what would be collected without calling any API"),
+):
+    if dry_run:
+        search_pages = -(-videos // youtube_api.SEARCH_PAGE_SIZE)
+        print(f"Keyword: {keyword!r}, up to {videos} videos")
+        print(f"Search: {search_pages} pages, {search_pages * youtube_api.QUOTA_COSTS['youtube.search.list']} "
+              f"quota units (plus one unit per 50 videos for metadata)")
+        print(f"LLM servers: {llm.base_urls()}")
+        print(f"HTTP cache: {http_cache or 'disabled'}" + (" (offline)" if offline else ""))
+        print(f"Output: {output_dir}, {excel_file}")
+        return
+
+    if http_cache or offline:
+        youtube_api.configure_http_cache(http_cache or "http_cache.sqlite", offline=offline)
+    if daily_quota and not offline:
+        youtube_api.configure_quota("quota.sqlite", daily_quota)
 
-# Initialize the LLM instance and point to the ATR lab server machine
-llm = Ollama(base_url="http://131.123.41.132:11434", model="llava:34b")
-
-
-def get_youtube_videos_by_keyword(api_key, keyword, max_results):
-    # Build the YouTube service object
-    youtube = build('youtube', 'v3', developerKey=api_key)
-
-    # Call the search.list method to retrieve results matching the specified query term
-    search_response = youtube.search().list(
-        q=keyword,
-        part='id,snippet',
-        maxResults=max_results
-    ).execute()
-
-    # Extract video details from the search response
-    videos = []
-    for item in search_response.get('items', []):
-        if item['id']['kind'] == 'youtube#video':
-            video_data = {
-                'title': item['snippet']['title'],
-                'videoId': item['id']['videoId'],
-                'description': item['snippet']['description'],
-                'channelTitle': item['snippet']['channelTitle'],
-                'publishedAt': item['snippet']['publishedAt']
-            }
-            videos.append(video_data)
-
-    return videos
-
-
-def get_video_details(api_key, video_id):
-    youtube = build('youtube', 'v3', developerKey=api_key)
-    request = youtube.videos().list(part="snippet,statistics", id=video_id)
-    response = request.execute()
-    item = response['items'][0]
-    details = {
-        'Title': item['snippet']['title'],
-        'Description': item['snippet']['description'],
-        'Publish Date': item['snippet']['publishedAt'],
-        'View Count': item['statistics']['viewCount'],
-        'URL': f"https://www.youtube.com/watch?v={video_id}"
-    }
-    return details
-
-
-def get_transcript(video_id):
     try:
-        transcript = yta.get_transcript(video_id)
-        processed_transcript = ' '.join([val['text'] for val in transcript if 'text' in val])
-        return processed_transcript
-    except Exception as e:
-        print(f"Error getting transcript for video {video_id}: {e}")
-        return ""
-
-
-def organize_transcript(video_id):
-    # Get the transcript text
-    info = get_transcript(video_id)
-
-    # You can update the prompt to whatever you want
-    organize_text = llm.invoke(f"""
-                rearrange the following text into a paragraph without losing any words:
-                "{info}". 
-                """)
-    return organize_text
-
-def summarize_transcript(video_id):
-    # Get the transcript text
-    info = organize_transcript(video_id)
-
-    # You can update the prompt to whatever you want
-    summary_text = llm.invoke(f"""
-                summarize the following text without losing any important points:
-                "{info}". 
-                """)
-    return summary_text
-
-def remove_duplicates(video):
-    new = []
-    [new.append(x) for x in video if x not in new]
-    return new
-
-# Example usage
-api_key = ''
-keyword = input("Enter Search Keyword: ")
-num_Videos = input("Enter Number of Videos: ")
-duplicates = input("Do You Want to Remove Duplicate Videos? (Y/N) ")
-videos = get_youtube_videos_by_keyword(api_key, keyword, num_Videos)
-if duplicates == "Y":
-    videos = remove_duplicates(videos)
-
-
-video_details_list = []
-count = 1
-for video in videos:
-    print(video['videoId'])
-    print("Videos Processed: " + str(count))
-    count += 1
-    print("Videos Remaining: " + str(len(videos) - count))
-    video_details = get_video_details(api_key, video['videoId'])
-    # Add the organized transcript to the video details
-    video_details['Transcript'] = organize_transcript(video['videoId'])
-    video_details['Transcript Summary'] = summarize_transcript(video['videoId'])
-    video_details_list.append(video_details)
-
-# Create a DataFrame with video details
-df = pd.DataFrame(video_details_list)
-
-# Define the Excel file name
-excel_file = "Transcript Record.xlsx"
-
-# Export the DataFrame to Excel
-df.to_excel(excel_file, index=False)
-print(f'Video details exported to {excel_file}')
-
+        youtube_transcripts.collect_transcripts(keyword, videos, api_key=api_key, dedupe=remove_duplicates,
+                                                export_dir=output_dir, excel_file=excel_file,
+                                                export_formats=("csv", "parquet") if parquet else ("csv",),
+                                                llm_workers=llm_workers, transcript_workers=transcript_workers)
+    finally:
+        youtube_api.close_quota()
+        youtube_api.close_http_cache()
+
+    if search_index:
+        index = SearchIndex(search_index)
+        print(f"Indexed {update_from_exports(index, transcript_dir=output_dir)} new documents in {search_index}")
+        index.close()
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,4 @@
+"""
+Offline benchmarks: drive the collection scripts end to end against local stand-ins
+for the YouTube Data API, the transcript API, Ollama, Pushshift and PRAW
+"""
@@ -0,0 +1,295 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+WORDS = ("robot restaurant waiter food service japan korea china usa staff tray delivery cute scary "
+         "future jobs cost price slow fast order table kitchen customer tip human cat design").split()
+
+COMMENTS_EPOCH = datetime(2024, 2, 1, tzinfo=timezone.utc)
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+class FakeRequest:
+    """
+    Stand-in for googleapiclient.http.HttpRequest
+    """
+
+    def __init__(self, method_id: str, latency: float, build_response, **params):
+        self.methodId = method_id
+        self.params = params
+        self._latency = latency
+        self._build_response = build_response
+
+    def execute(self, http=None):
+        time.sleep(self._latency)
+        return self._build_response()
+
+
+class _Resource:
+    def __init__(self, **methods):
+        for name, method in methods.items():
+            setattr(self, name, method)
+
+
+class FakeYouTube:
+    """
+    Deterministic stand-in for the `youtube` v3 service covering search, videos and
+    commentThreads, with pagination and a fixed latency per call
+    """
+
+    def __init__(self, videos: int = 200, comments_per_video: int = 300, latency: float = 0.05,
+                 seed: int = 0):
+        self.video_count = videos
+        self.comments_per_video = comments_per_video
+        self.latency = latency
+        self.seed = seed
+
+    @staticmethod
+    def video_id(index: int) -> str:
+        return f"vid{index:08d}"
+
+    def _snippet(self, index: int) -> dict:
+        rng = random.Random(self.seed * 1_000_003 + index)
+        return {
+            'title': f"Restaurant robot video {index}",
+            'description': _sentence(rng, 30),
+            'channelTitle': f"channel {index % 17}",
+            'publishedAt': f"2024-01-{index % 28 + 1:02d}T00:00:00Z",
+        }
+
+    # search().list
+    def _search_list(self, q, part, maxResults, pageToken=None, type=None, **_):
+        start = int(pageToken or 0)
+        end = min(start + int(maxResults), self.video_count)
+
+        def response():
+            items = [{'id': {'kind': 'youtube#video', 'videoId': self.video_id(i)}, 'snippet': self._snippet(i)}
+                     for i in range(start, end)]
+            result = {'items': items}
+            if end < self.video_count:
+                result['nextPageToken'] = str(end)
+            return result
+
+        return FakeRequest("youtube.search.list", self.latency, response)
+
+    def search(self):
+        return _Resource(list=self._search_list)
+
+    # videos().list
+    def _videos_list(self, part, id, maxResults=None, **_):
+        def response():
+            items = []
+            for video_id in id.split(","):
+                index = int(video_id[3:])
+                items.append({'id': video_id, 'snippet': self._snippet(index),
+                              'statistics': {'viewCount': str(1000 + index * 37), 'commentCount':
+                                             str(self.comments_per_video)}})
+            return {'items': items}
+
+        return FakeRequest("youtube.videos.list", self.latency, response)
+
+    def videos(self):
+        return _Resource(list=self._videos_list)
+
+    # commentThreads().list / list_next
+    def _comment_threads_list(self, part, videoId, maxResults=100, pageToken=None, order=None, **_):
+        start = int(pageToken or 0)
+        end = min(start + int(maxResults), self.comments_per_video)
+        index = int(videoId[3:])
+
+        def response():
+            items = []
+            for i in range(start, end):
+                rng = random.Random(index * 1_000_003 + i)
+                # A fifth of the comments are copies of a handful of spam/joke comments
+                spam = (i // 5) % 4
+                text = f"copy pasta {spam} " + _sentence(random.Random(spam), 12) if i % 5 == 0 \
+                    else _sentence(rng, rng.randint(5, 40))
+                # Newest first, like order=time
+                published = COMMENTS_EPOCH + timedelta(seconds=self.comments_per_video - i)
+                items.append({'id': f"{videoId}-c{i}", 'snippet': {
+                    'videoId': videoId,
+                    'topLevelComment': {'id': f"{videoId}-c{i}", 'snippet': {
+                        'textDisplay': text,
+                        'textOriginal': text,
+                        'publishedAt': published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                        'updatedAt': published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                        'likeCount': rng.randint(0, 50),
+                    }}}})
+            result = {'items': items}
+            if end < self.comments_per_video:
+                result['nextPageToken'] = str(end)
+            return result
+
+        return FakeRequest("youtube.commentThreads.list", self.latency, response,
+                           part=part, videoId=videoId, maxResults=maxResults, order=order)
+
+    def _comment_threads_list_next(self, previous_request, previous_response):
+        page_token = previous_response.get('nextPageToken')
+        if not page_token:
+            return None
+        params = dict(previous_request.params, pageToken=page_token)
+        return self._comment_threads_list(**params)
+
+    def commentThreads(self):
+        return _Resource(list=self._comment_threads_list, list_next=self._comment_threads_list_next)
+
+
+class FakeTranscriptApi:
+    """
+    Stand-in for YouTubeTranscriptApi.get_transcript
+    """
+
+    def __init__(self, segments: int = 400, latency: float = 0.2):
+        self.segments = segments
+        self.latency = latency
+
+    def get_transcript(self, video_id, languages=("en",)):
+        time.sleep(self.latency)
+        rng = random.Random(video_id)
+        return [{'text': _sentence(rng, rng.randint(4, 12)), 'start': i * 3.5, 'duration': 3.5}
+                for i in range(self.segments)]
+
+
+class FakeSubmission:
+    def __init__(self, index: int, created_utc: int, subreddit: str):
+        rng = random.Random(index)
+        self.id = f"s{index:07x}"
+        self.created_utc = created_utc
+        self.title = f"Robot waiter {index}"
+        self.selftext = _sentence(rng, 40)
+        self.full_link = f"https://www.reddit.com/r/{subreddit}/comments/{self.id}/"
+        self.d_ = {"id": self.id, "subreddit": subreddit, "author": f"user{index % 97}",
+                   "created_utc": created_utc, "title": self.title, "selftext": self.selftext,
+                   "full_link": self.full_link, "num_comments": 0, "score": rng.randint(0, 500)}
+
+
+class FakePushshift:
+    """
+    Stand-in for PushshiftAPI: `submissions` submissions evenly spread over
+    `[utc_after, utc_before)`, returned newest first
+    """
+
+    def __init__(self, utc_after: int, utc_before: int, submissions: int = 500, latency: float = 0.2):
+        self.latency = latency
+        step = max(1, (utc_before - utc_after) // max(submissions, 1))
+        self.created = [utc_after + i * step for i in range(submissions)]
+
+    def search_submissions(self, subreddit=None, after=None, before=None, limit=100, **_):
+        time.sleep(self.latency)
+        matching = [i for i, created in enumerate(self.created)
+                    if (after is None or created > after) and (before is None or created < before)]
+        for i in sorted(matching, key=lambda i: -self.created[i])[:limit]:
+            yield FakeSubmission(i, self.created[i], subreddit)
+
+
+class FakeRedditor:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+class FakeComment:
+    def __init__(self, submission_id: str, index: int, parent_id: str, depth: int):
+        rng = random.Random(f"{submission_id}-{index}")
+        self.id = f"{submission_id}c{index}"
+        self.link_id = f"t3_{submission_id}"
+        self.parent_id = parent_id
+        self.depth = depth
+        self.author = FakeRedditor(f"user{rng.randint(0, 500)}")
+        self.body = _sentence(rng, rng.randint(5, 40))
+        self.created_utc = 1_700_000_000 + index
+        self.score = rng.randint(-5, 100)
+        self.permalink = f"/comments/{submission_id}/_/{self.id}/"
+        self.replies = []
+
+
+class FakeMoreComments:
+    """
+    MoreComments stub hiding `hidden` comments; expanding it costs one request and loads
+    up to 100 of them, leaving a new stub for the rest
+    """
+
+    def __init__(self, parent_id: str, hidden: list, depth: int, latency: float):
+        self.parent_id = parent_id
+        self.children = [comment.id for comment in hidden]
+        self.count = len(hidden)
+        self.depth = depth
+        self.submission = None
+        self._hidden = hidden
+        self._latency = latency
+
+    def comments(self, update=True):
+        time.sleep(self._latency)
+        loaded = self._hidden[:100]
+        rest = self._hidden[100:]
+        return loaded + ([FakeMoreComments(self.parent_id, rest, self.depth, self._latency)] if rest else [])
+
+
+class FakeCommentForest:
+    """
+    Comment forest whose top levels are loaded and whose deeper replies sit behind one
+    MoreComments stub per second-level comment
+    """
+
+    def __init__(self, submission_id: str, comments: int, latency: float):
+        self._latency = latency
+        rng = random.Random(submission_id)
+        self._all = []
+        self._top = []
+        for i in range(comments):
+            parent = self._all[rng.randrange(len(self._all))] if self._all and rng.random() < 0.7 else None
+            comment = FakeComment(submission_id, i, f"t1_{parent.id}" if parent else f"t3_{submission_id}",
+                                  parent.depth + 1 if parent else 0)
+            (parent.replies if parent else self._top).append(comment)
+            self._all.append(comment)
+
+    @staticmethod
+    def _descendants(comment) -> list:
+        found = []
+        stack = list(reversed(comment.replies))
+        while stack:
+            reply = stack.pop()
+            found.append(reply)
+            stack.extend(reversed(reply.replies))
+        return found
+
+    def list(self):
+        loaded = [comment for comment in self._all if comment.depth < 2]
+        stubs = [FakeMoreComments(f"t1_{comment.id}", self._descendants(comment), 2, self._latency)
+                 for comment in loaded if comment.depth == 1 and comment.replies]
+        return loaded + stubs
+
+
+class FakeRedditSubmission:
+    def __init__(self, submission_id: str, comments: int, latency: float):
+        self.id = submission_id
+        self.num_comments = comments
+        self.comments = FakeCommentForest(submission_id, comments, latency)
+
+
+class FakeReddit:
+    def __init__(self, comments_per_submission: int, latency: float):
+        self.comments_per_submission = comments_per_submission
+        self.latency = latency
+
+    def submission(self, id=None):
+        time.sleep(self.latency)
+        return FakeRedditSubmission(id, self.comments_per_submission, self.latency)
+
+
+class FakeRedditClients:
+    """
+    Stand-in for datacollection.reddit.RedditClients
+    """
+
+    def __init__(self, comments_per_submission: int = 200, latency: float = 0.1):
+        self.reddit = FakeReddit(comments_per_submission, latency)
+
+    def get(self):
+        return self.reddit
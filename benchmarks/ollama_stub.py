@@ -0,0 +1,60 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class OllamaStub:
+    """
+    Local HTTP server answering the Ollama `/api/generate` API with a short canned
+    completion after `latency + prompt_chars * seconds_per_char` seconds
+    """
+
+    def __init__(self, latency: float = 0.5, seconds_per_char: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.seconds_per_char = seconds_per_char
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = payload.get("prompt", "")
+                stub.requests += 1
+                time.sleep(stub.latency + len(prompt) * stub.seconds_per_char)
+                text = f"Summary of {len(prompt)} characters: " + " ".join(prompt.split()[:20])
+                done = {"model": payload.get("model"), "response": "", "done": True,
+                        "prompt_eval_count": len(prompt) // 4, "eval_count": len(text) // 4}
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                if payload.get("stream", True):
+                    self.wfile.write((json.dumps({"model": payload.get("model"), "response": text,
+                                                  "done": False}) + "\n").encode("utf-8"))
+                    self.wfile.write((json.dumps(done) + "\n").encode("utf-8"))
+                else:
+                    self.wfile.write(json.dumps(dict(done, response=text)).encode("utf-8"))
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
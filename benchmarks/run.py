@@ -0,0 +1,182 @@
+"""
+Run the collection scripts end to end against local stand-ins and report throughput,
+peak RSS and per-stage time. No API quota or LLM server is used.
+
+    python -m benchmarks.run --scenario all --videos 200 --output bench.json
+    python -m benchmarks.run --scenario all --baseline bench.json   # exits 1 on regression
+
+Every scenario runs in its own subprocess so peak RSS is measured per scenario. The
+collectors are driven through their library entry points with fake clients passed in.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SCENARIOS = ("comments", "transcripts", "reddit")
+
+# Throughput figure compared against the baseline for each scenario
+PRIMARY_RATE = {"comments": "videos", "transcripts": "videos", "reddit": "submissions"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--videos", type=int, default=50)
+    parser.add_argument("--comments-per-video", type=int, default=300)
+    parser.add_argument("--transcript-segments", type=int, default=400)
+    parser.add_argument("--submissions", type=int, default=200)
+    parser.add_argument("--comments-per-submission", type=int, default=200)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Seconds per fake API call")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per stub LLM call")
+    parser.add_argument("--llm-seconds-per-char", type=float, default=0.0,
+                        help="Extra stub LLM seconds per prompt character")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the results of an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative throughput drop / RSS growth against the baseline")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def run_comments(args):
+    from benchmarks.fakes import FakeYouTube
+    from datacollection import youtube_comments
+
+    fake = FakeYouTube(videos=args.videos, comments_per_video=args.comments_per_video, latency=args.api_latency)
+    youtube_comments.collect_comments("restaurant robots", args.videos, youtube=fake)
+
+
+def run_transcripts(args):
+    from youtube_transcript_api import YouTubeTranscriptApi
+    from benchmarks.fakes import FakeTranscriptApi, FakeYouTube
+    from datacollection import youtube_transcripts
+
+    fake = FakeYouTube(videos=args.videos, latency=args.api_latency)
+    YouTubeTranscriptApi.get_transcript = FakeTranscriptApi(args.transcript_segments, args.api_latency).get_transcript
+    youtube_transcripts.collect_transcripts("restaurant robots", args.videos, youtube=fake)
+
+
+def run_reddit(args):
+    from benchmarks.fakes import FakePushshift, FakeRedditClients
+    from datacollection import reddit
+
+    utc_before = 1_700_000_000
+    utc_after = utc_before - 30 * 24 * 3600
+    pushshift = FakePushshift(utc_after, utc_before, args.submissions, args.api_latency)
+    reddit_clients = FakeRedditClients(args.comments_per_submission, args.api_latency)
+    reddit.init_clients = lambda *a, **kw: (pushshift, reddit_clients)
+    reddit.collect("bench", output_dir="data", batch_size=100, laps=3, utc_after=utc_after,
+                   utc_before=utc_before)
+
+
+def run_child(args):
+    """
+    Run one scenario in this (fresh) process inside a scratch directory
+    """
+    sys.path.insert(0, str(REPO_ROOT))
+    from datacollection.metrics import metrics
+
+    runner = {"comments": run_comments, "transcripts": run_transcripts, "reddit": run_reddit}[args.child]
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            start = time.perf_counter()
+            runner(args)
+            wall = time.perf_counter() - start
+        finally:
+            os.chdir(REPO_ROOT)
+
+    items = {name: metrics.counter(name) for name in ("videos", "comments", "submissions")}
+    result = {
+        "scenario": args.child,
+        "wall_seconds": wall,
+        "items": items,
+        "items_per_second": {name: count / wall for name, count in items.items() if count},
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "llm_calls": metrics.counter("llm_calls"),
+        "stages": metrics.report()["stages"],
+    }
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def run_scenario(scenario: str, argv, env) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_file = f.name
+    try:
+        subprocess.run([sys.executable, "-m", "benchmarks.run", *argv, "--child", scenario,
+                        "--result-file", result_file],
+                       cwd=REPO_ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+        with open(result_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(result_file)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for scenario, result in results.items():
+        if scenario not in baseline:
+            continue
+        previous = baseline[scenario]
+        rate = PRIMARY_RATE[scenario]
+        old_rate = previous["items_per_second"].get(rate, 0)
+        new_rate = result["items_per_second"].get(rate, 0)
+        if old_rate and new_rate < old_rate * (1 - tolerance):
+            regressions.append(f"{scenario}: {rate}/s dropped from {old_rate:.2f} to {new_rate:.2f}")
+        if result["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{scenario}: peak RSS grew from {previous['peak_rss_mb']:.0f} MB "
+                               f"to {result['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def print_result(result: dict):
+    rates = ", ".join(f"{rate:.2f} {name}/s" for name, rate in result["items_per_second"].items())
+    print(f"{result['scenario']}: {result['wall_seconds']:.1f}s, {rates}, "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB, {result['llm_calls']:.0f} LLM calls")
+    for stage, stats in sorted(result["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"    {stage:<32} {stats['count']:>7} calls {stats['total_seconds']:>9.1f}s total "
+              f"{stats['p95_seconds']:>7.2f}s p95")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.child:
+        run_child(args)
+        return 0
+
+    from benchmarks.ollama_stub import OllamaStub
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = {}
+    with OllamaStub(args.llm_latency, args.llm_seconds_per_char) as ollama:
+        env = dict(os.environ, OLLAMA_BASE_URL=ollama.base_url)
+        for scenario in scenarios:
+            results[scenario] = run_scenario(scenario, argv, env)
+            print_result(results[scenario])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
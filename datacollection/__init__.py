@@ -0,0 +1,3 @@
+"""
+Shared helpers used by the YouTube and Reddit collection scripts
+"""
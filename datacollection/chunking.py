@@ -0,0 +1,101 @@
+from datacollection.llm_cache import LLMCache, cached_invoke, cached_submit
+
+# Rough English average; good enough to keep prompts inside the context window
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _split_oversized(item: str, max_tokens: int):
+    """
+    Split a single item that is larger than the budget on word boundaries
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    words = [word[i:i + max_chars] for word in item.split() for i in range(0, len(word), max_chars)]
+    piece = []
+    size = 0
+    for word in words:
+        word_tokens = estimate_tokens(word)
+        if piece and size + word_tokens > max_tokens:
+            yield " ".join(piece)
+            piece, size = [], 0
+        piece.append(word)
+        size += word_tokens
+    if piece:
+        yield " ".join(piece)
+
+
+def chunk_items(items, max_tokens: int, overlap_tokens: int = 0):
+    """
+    Group `items` (comments, transcript sentences...) into chunks of at most `max_tokens`.
+
+    The last items of a chunk, up to `overlap_tokens`, are repeated at the start of the
+    next one so that context spanning a boundary is not lost.
+    """
+    pieces = []
+    for item in items:
+        if estimate_tokens(item) > max_tokens:
+            pieces.extend(_split_oversized(item, max_tokens))
+        else:
+            pieces.append(item)
+
+    chunks = []
+    current = []
+    size = 0
+    for piece in pieces:
+        piece_tokens = estimate_tokens(piece)
+        if current and size + piece_tokens > max_tokens:
+            chunks.append(current)
+            overlap = []
+            overlap_size = 0
+            for previous in reversed(current):
+                previous_tokens = estimate_tokens(previous)
+                if overlap_size + previous_tokens > overlap_tokens \
+                        or overlap_size + previous_tokens + piece_tokens > max_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += previous_tokens
+            current, size = overlap, overlap_size
+        current.append(piece)
+        size += piece_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _submit_all(llm, cache: LLMCache, template: str, texts) -> list:
+    # Queue every prompt first, then wait, so an LLMPool can run them in parallel
+    futures = [cached_submit(llm, cache, template, text) for text in texts]
+    return [future.result() for future in futures]
+
+
+def map_reduce(llm, cache: LLMCache, map_template: str, reduce_template, items, separator: str = "\n",
+               chunk_tokens: int = 3000, overlap_tokens: int = 100) -> str:
+    """
+    Run `map_template` over token-budgeted chunks of `items` in parallel, then merge the
+    chunk outputs with `reduce_template`. Parallelism comes from `llm` (an LLMPool
+    runs the chunk prompts concurrently across its hosts).
+
+    Inputs that fit in a single chunk are sent as one prompt, exactly as before. When
+    `reduce_template` is None the chunk outputs are simply concatenated (used when the
+    output must keep every word of the input). Merging is repeated until the partial
+    results fit in one prompt, so latency grows with log(input size) rather than with
+    the input size.
+    """
+    chunks = chunk_items(items, chunk_tokens, overlap_tokens)
+    if len(chunks) <= 1:
+        return cached_invoke(llm, cache, map_template, separator.join(items))
+
+    partials = _submit_all(llm, cache, map_template, [separator.join(chunk) for chunk in chunks])
+
+    if reduce_template is None:
+        return "\n".join(partials)
+
+    while True:
+        groups = chunk_items(partials, chunk_tokens)
+        # Stop when merging no longer shrinks the number of partial results
+        if len(groups) <= 1 or len(groups) >= len(partials):
+            return cached_invoke(llm, cache, reduce_template, "\n\n".join(partials))
+        partials = _submit_all(llm, cache, reduce_template, ["\n\n".join(group) for group in groups])
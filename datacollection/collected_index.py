@@ -0,0 +1,83 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class CollectedIndex:
+    """
+    Persistent record of the items (videos, submissions, comments) collected by earlier
+    runs, so a new run only fetches and summarizes what it has not seen yet.
+
+    Items are identified by a `kind` ("youtube_comments", "reddit_submission", ...) and
+    the source id. An item can also keep a small JSON watermark (e.g. the newest comment
+    seen) for sources that are revisited incrementally.
+    """
+
+    def __init__(self, path: str = "collected_index.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS collected (
+                kind TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                collected_at REAL NOT NULL,
+                PRIMARY KEY (kind, item_id)
+            ) WITHOUT ROWID""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                kind TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (kind, item_id)
+            ) WITHOUT ROWID""")
+        self._conn.commit()
+
+    def __contains__(self, key) -> bool:
+        kind, item_id = key
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM collected WHERE kind = ? AND item_id = ?",
+                                     (kind, item_id)).fetchone()
+        return row is not None
+
+    def seen(self, kind: str, item_ids) -> set:
+        """
+        Return the subset of `item_ids` already collected
+        """
+        item_ids = list(item_ids)
+        found = set()
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(item_ids), 500):
+                batch = item_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT item_id FROM collected WHERE kind = ? AND item_id IN ({placeholders})",
+                    [kind, *batch])
+                found.update(row[0] for row in rows)
+        return found
+
+    def add(self, kind: str, item_ids):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO collected VALUES (?, ?, ?)",
+                                   ((kind, item_id, now) for item_id in item_ids))
+            self._conn.commit()
+
+    def watermark(self, kind: str, item_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM watermarks WHERE kind = ? AND item_id = ?",
+                                     (kind, item_id)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set_watermark(self, kind: str, item_id: str, state: dict):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?)",
+                               (kind, item_id, json.dumps(state), time.time()))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,209 @@
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+# Arrays are stored little-endian whatever the machine
+_SWAP = sys.byteorder != "little"
+_LENGTH = struct.Struct("<I")
+
+
+def _to_bytes(values: array) -> bytes:
+    if _SWAP:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if _SWAP:
+        values.byteswap()
+    return values
+
+
+class CommentForest:
+    """
+    The comment tree of one submission in columnar form.
+
+    Rows are in depth-first pre-order, so every subtree is the contiguous row range
+    `[row, row + sizes[row])` and a parent always comes before its replies. Per row:
+    `ids`, `parents` (row of the parent comment, -1 for top-level comments and comments
+    whose parent was not fetched), `depths`, `sizes` (rows in the subtree, itself
+    included), `created` and `scores`. The replies of row `i` are
+    `children[child_offsets[i]:child_offsets[i + 1]]`; the top-level rows are `roots`.
+    """
+
+    def __init__(self, submission_id: str, ids: List[str], parents: array, created: array, scores: array):
+        self.submission_id = submission_id
+        self.ids = ids
+        self.parents = parents
+        self.created = created
+        self.scores = scores
+        self._derive()
+
+    def _derive(self):
+        # Everything else follows from the parent rows because parents precede their replies
+        n = len(self.ids)
+        self.depths = array('h', [0]) * n
+        self.sizes = array('i', [1]) * n
+        counts = array('i', [0]) * (n + 1)
+        for row in range(n):
+            parent = self.parents[row]
+            if parent >= 0:
+                self.depths[row] = self.depths[parent] + 1
+                counts[parent + 1] += 1
+        for row in range(n - 1, -1, -1):
+            parent = self.parents[row]
+            if parent >= 0:
+                self.sizes[parent] += self.sizes[row]
+        self.child_offsets = array('i', [0]) * (n + 1)
+        for row in range(n):
+            self.child_offsets[row + 1] = self.child_offsets[row] + counts[row + 1]
+        self.children = array('i', [0]) * self.child_offsets[n]
+        filled = array('i', self.child_offsets[:n])
+        roots = []
+        for row in range(n):
+            parent = self.parents[row]
+            if parent >= 0:
+                self.children[filled[parent]] = row
+                filled[parent] += 1
+            else:
+                roots.append(row)
+        self.roots = array('i', roots)
+        self._rows = None
+
+    @classmethod
+    def build(cls, submission_id: str, comments) -> "CommentForest":
+        """
+        Build from PRAW comments (anything with `id`, `parent_id`, `created_utc` and
+        `score`) in any order, e.g. `submission.comments.list()`. Siblings keep their
+        order in `comments`.
+        """
+        comments = list(comments)
+        position = {comment.id: i for i, comment in enumerate(comments)}
+        replies = [[] for _ in comments]
+        top_level = []
+        for i, comment in enumerate(comments):
+            parent = position.get(comment.parent_id[3:]) if comment.parent_id.startswith("t1_") else None
+            (replies[parent] if parent is not None else top_level).append(i)
+
+        order = []
+        parents = array('i')
+        stack = [(i, -1) for i in reversed(top_level)]
+        while stack:
+            i, parent_row = stack.pop()
+            row = len(order)
+            order.append(i)
+            parents.append(parent_row)
+            stack.extend((child, row) for child in reversed(replies[i]))
+        return cls(submission_id, [comments[i].id for i in order], parents,
+                   array('q', (int(comments[i].created_utc) for i in order)),
+                   array('i', (int(comments[i].score or 0) for i in order)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, comment_id: str) -> int:
+        if self._rows is None:
+            self._rows = {comment_id: row for row, comment_id in enumerate(self.ids)}
+        return self._rows[comment_id]
+
+    def subtree(self, row: int) -> range:
+        return range(row, row + self.sizes[row])
+
+    def replies(self, row: int) -> array:
+        return self.children[self.child_offsets[row]:self.child_offsets[row + 1]]
+
+    def ancestors(self, row: int) -> List[int]:
+        """
+        Rows from the parent of `row` up to its top-level comment
+        """
+        path = []
+        row = self.parents[row]
+        while row >= 0:
+            path.append(row)
+            row = self.parents[row]
+        return path
+
+    def at_depth(self, depth: int) -> List[int]:
+        return [row for row, row_depth in enumerate(self.depths) if row_depth == depth]
+
+    def max_depth(self) -> int:
+        return max(self.depths, default=-1)
+
+    def top_replies(self, row: Optional[int] = None, top: int = 10) -> List[int]:
+        """
+        The highest scored replies of `row` (of the submission when None)
+        """
+        candidates = self.roots if row is None else self.replies(row)
+        return sorted(candidates, key=lambda child: -self.scores[child])[:top]
+
+    def to_bytes(self) -> bytes:
+        """
+        zlib-compressed record: a small JSON header, the ids and the parent, created and
+        score columns (the other columns are rebuilt on load)
+        """
+        header = json.dumps({"submission_id": self.submission_id, "rows": len(self.ids)}).encode("utf-8")
+        ids = ",".join(self.ids).encode("ascii")
+        parts = [header, ids, _to_bytes(self.parents), _to_bytes(self.created), _to_bytes(self.scores)]
+        return zlib.compress(b"".join(_LENGTH.pack(len(part)) + part for part in parts), 6)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CommentForest":
+        data = zlib.decompress(data)
+        parts = []
+        offset = 0
+        while offset < len(data):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            parts.append(data[offset:offset + length])
+            offset += length
+        header = json.loads(parts[0])
+        ids = parts[1].decode("ascii").split(",") if header["rows"] else []
+        return cls(header["submission_id"], ids, _from_bytes('i', parts[2]), _from_bytes('q', parts[3]),
+                   _from_bytes('i', parts[4]))
+
+
+class ForestWriter:
+    """
+    Append-only file of length-prefixed CommentForest records, one per submission
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "ab")
+
+    def write(self, forest: CommentForest):
+        data = forest.to_bytes()
+        self._file.write(_LENGTH.pack(len(data)) + data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_forests(path: str) -> Iterator[CommentForest]:
+    with open(path, "rb") as f:
+        while True:
+            prefix = f.read(_LENGTH.size)
+            if len(prefix) < _LENGTH.size:
+                return
+            (length,) = _LENGTH.unpack(prefix)
+            data = f.read(length)
+            if len(data) < length:
+                # A run killed mid-write leaves a truncated last record
+                return
+            yield CommentForest.from_bytes(data)
+
+
+def load_forests(path: str) -> Dict[str, CommentForest]:
+    """
+    Every forest in the file by submission id (a later record for the same submission wins)
+    """
+    return {forest.submission_id: forest for forest in read_forests(path)}
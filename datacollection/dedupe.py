@@ -0,0 +1,101 @@
+import hashlib
+import re
+import struct
+from collections import Counter
+from typing import List
+
+from datacollection.keywords import TAG_RE
+
+# MinHash signature length and LSH banding: 16 bands of 4 rows make texts with a Jaccard
+# similarity of 0.7 candidates with ~99% probability, and 0.3 with ~12%
+NUM_PERM = 64
+BANDS = 16
+# Candidates are merged when their estimated Jaccard similarity reaches this
+THRESHOLD = 0.7
+
+# Each shingle is hashed with salted 64-byte BLAKE2b digests, 16 32-bit hash values per
+# digest, instead of evaluating NUM_PERM permutations in Python
+_SALTS = [i.to_bytes(16, "little") for i in range(NUM_PERM // 16)]
+_HASH_FORMAT = f"<{NUM_PERM}I"
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> tuple:
+    # Markup, case and punctuation do not make a comment different
+    text = TAG_RE.sub(" ", text)
+    words = tuple(WORD_RE.findall(text.lower()))
+    # Emoji- or punctuation-only comments have no words: only identical ones are duplicates
+    return words or (text.strip(),)
+
+
+def shingles(words: tuple) -> set:
+    """
+    Word bigrams (the single word for one-word texts)
+    """
+    if len(words) < 2:
+        return {" ".join(words)}
+    return {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def minhash(grams: set) -> tuple:
+    hashes = [struct.unpack(_HASH_FORMAT, b"".join(hashlib.blake2b(gram.encode("utf-8"), salt=salt).digest()
+                                                   for salt in _SALTS))
+              for gram in grams]
+    return tuple(map(min, zip(*hashes)))
+
+
+def _similarity(first: tuple, second: tuple) -> float:
+    return sum(x == y for x, y in zip(first, second)) / NUM_PERM
+
+
+def cluster_texts(texts: List[str], threshold: float = THRESHOLD) -> List[int]:
+    """
+    Group near-duplicate texts with MinHash signatures and LSH banding.
+
+    Returns one cluster id per text; ids are numbered by first appearance, so the first
+    text is always in cluster 0. Identical texts (after normalization) share one signature,
+    and every text is only compared with the first text of each LSH bucket it falls in,
+    so the cost grows linearly with the number of texts.
+    """
+    rows = NUM_PERM // BANDS
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    signatures = {}
+    first_with_words = {}
+    buckets = {}
+    for i, text in enumerate(texts):
+        words = normalize(text)
+        if words in first_with_words:
+            parent[i] = find(first_with_words[words])
+            continue
+        first_with_words[words] = i
+        signature = signatures[i] = minhash(shingles(words))
+        for band in range(BANDS):
+            key = (band, signature[band * rows:(band + 1) * rows])
+            candidate = buckets.setdefault(key, i)
+            if candidate != i and find(candidate) != find(i) \
+                    and _similarity(signature, signatures[candidate]) >= threshold:
+                parent[find(i)] = find(candidate)
+
+    cluster_ids = {}
+    return [cluster_ids.setdefault(find(i), len(cluster_ids)) for i in range(len(texts))]
+
+
+def collapse(texts: List[str], cluster_ids: List[int]) -> List[str]:
+    """
+    One representative (the first text) per cluster, prefixed with the cluster size when
+    several texts were merged, in order of first appearance
+    """
+    sizes = Counter(cluster_ids)
+    representatives = {}
+    for text, cluster_id in zip(texts, cluster_ids):
+        representatives.setdefault(cluster_id, text)
+    return [text if sizes[cluster_id] == 1 else f"[{sizes[cluster_id]} similar comments] {text}"
+            for cluster_id, text in representatives.items()]
@@ -0,0 +1,220 @@
+import csv
+import os
+from datetime import datetime
+from os.path import join
+from pathlib import Path
+from typing import Dict, List
+
+# Excel hard limits
+XLSX_MAX_ROWS = 1_048_576
+XLSX_MAX_CELL_CHARS = 32_767
+
+# Transcripts, long comments and self posts do not fit csv's default 128 KiB field limit.
+# Set here once for the process; the modules reading exported tables import this module.
+CSV_FIELD_SIZE_LIMIT = 2 ** 31 - 1
+csv.field_size_limit(CSV_FIELD_SIZE_LIMIT)
+
+
+class CsvTableWriter:
+    """
+    Append rows to `<output_dir>/<table>.csv`, flushing after every write. The file
+    accumulates across runs; the header is only written when the file is new, and a file
+    written before columns were added is rewritten once with the new header.
+    """
+
+    def __init__(self, output_dir: str, table: str, columns: List[str]):
+        path = join(output_dir, f"{table}.csv")
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new_file:
+            CsvTableWriter._add_columns(path, columns)
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, columns, dialect="excel", extrasaction="ignore")
+        if new_file:
+            self._writer.writeheader()
+
+    @staticmethod
+    def _add_columns(path: str, columns: List[str]):
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), [])
+        if header == columns:
+            return
+        if not set(header) <= set(columns):
+            raise ValueError(f"{path} has the columns {header}, expected {columns}")
+        # Old rows get empty values in the new columns
+        tmp_path = path + ".tmp"
+        with open(path, "r", newline="", encoding="utf-8") as src, \
+                open(tmp_path, "w", newline="", encoding="utf-8") as dst:
+            writer = csv.DictWriter(dst, columns, dialect="excel")
+            writer.writeheader()
+            writer.writerows(csv.DictReader(src))
+        os.replace(tmp_path, path)
+
+    def write(self, rows: List[dict]):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetTableWriter:
+    """
+    Write rows to `<output_dir>/<table>/part-<run_id>.parquet`, one row group per
+    `chunk_rows` rows. The `<table>` directory is a dataset that pandas/pyarrow read
+    as a single table. Every column is stored as a string, as in the CSV files.
+    """
+
+    def __init__(self, output_dir: str, table: str, columns: List[str], run_id: str, chunk_rows: int):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow: `pip install pyarrow`")
+        self._pa = pa
+        self._pq = pq
+        self._columns = columns
+        # Explicit, so a column that is empty in the first chunk is not inferred as type null
+        self._schema = pa.schema([(column, pa.string()) for column in columns])
+        self._chunk_rows = chunk_rows
+        self._buffer = []
+        self._writer = None
+        table_dir = join(output_dir, table)
+        Path(table_dir).mkdir(parents=True, exist_ok=True)
+        self._path = join(table_dir, f"part-{run_id}.parquet")
+
+    def write(self, rows: List[dict]):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self._chunk_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        data = {column: [None if row.get(column) is None else str(row.get(column)) for row in self._buffer]
+                for column in self._columns}
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, self._schema)
+        table = self._pa.Table.from_pydict(data, schema=self._schema)
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+class XlsxWorkbookWriter:
+    """
+    Constant-memory XLSX export: each row is written to a temporary file as soon as it
+    arrives instead of being held in a DataFrame. Sheets that reach Excel's row limit
+    continue on a new sheet, and cells longer than Excel's limit are truncated.
+    """
+
+    def __init__(self, path: str, sheets: Dict[str, str], tables: Dict[str, List[str]]):
+        try:
+            import xlsxwriter
+        except ImportError:
+            raise ImportError("XLSX export requires xlsxwriter: `pip install xlsxwriter`")
+        self._workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        self._sheets = sheets
+        self._tables = tables
+        self._worksheet = {}
+        self._next_row = {}
+        self._sheet_count = {}
+
+    def _new_sheet(self, table: str):
+        self._sheet_count[table] = self._sheet_count.get(table, 0) + 1
+        name = self._sheets[table]
+        if self._sheet_count[table] > 1:
+            name = f"{name} ({self._sheet_count[table]})"
+        worksheet = self._workbook.add_worksheet(name)
+        worksheet.write_row(0, 0, self._tables[table])
+        self._worksheet[table] = worksheet
+        self._next_row[table] = 1
+
+    def write(self, table: str, rows: List[dict]):
+        for row in rows:
+            if table not in self._worksheet or self._next_row[table] >= XLSX_MAX_ROWS:
+                self._new_sheet(table)
+            values = []
+            for column in self._tables[table]:
+                value = row.get(column)
+                if isinstance(value, str) and len(value) > XLSX_MAX_CELL_CHARS:
+                    value = value[:XLSX_MAX_CELL_CHARS]
+                values.append(value)
+            self._worksheet[table].write_row(self._next_row[table], 0, values)
+            self._next_row[table] += 1
+
+    def close(self):
+        # Tables that never received a row still get a sheet with their header
+        for table in self._tables:
+            if table not in self._worksheet:
+                self._new_sheet(table)
+        self._workbook.close()
+
+
+class StreamingExporter:
+    """
+    Write collected rows to disk as soon as a video/lap is finished, so memory does not
+    grow with the corpus and a crash only loses the unit of work in progress.
+
+    `tables` maps a table name to its columns; `formats` selects "csv" and/or "parquet".
+    When `xlsx_path` is set, a constant-memory XLSX with one sheet per table is written
+    too (`sheets` maps table names to sheet names; defaults to the table name).
+    """
+
+    def __init__(self, output_dir: str, tables: Dict[str, List[str]], formats=("csv",),
+                 xlsx_path: str = None, sheets: Dict[str, str] = None, chunk_rows: int = 10_000):
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        self.output_dir = output_dir
+        self.tables = tables
+        self.rows_written = {table: 0 for table in tables}
+        run_id = datetime.today().strftime('%Y%m%d%H%M%S')
+
+        self._writers = {table: [] for table in tables}
+        for table, columns in tables.items():
+            if "csv" in formats:
+                self._writers[table].append(CsvTableWriter(output_dir, table, columns))
+            if "parquet" in formats:
+                self._writers[table].append(ParquetTableWriter(output_dir, table, columns, run_id, chunk_rows))
+
+        self._xlsx = None
+        if xlsx_path:
+            sheets = {table: (sheets or {}).get(table, table) for table in tables}
+            self._xlsx = XlsxWorkbookWriter(xlsx_path, sheets, tables)
+
+    def copy_csv_to_xlsx(self):
+        """
+        Write the rows already in the CSV tables to the XLSX. The workbook is always
+        written from scratch, so a resumed run starts it with the rows of the earlier runs.
+        """
+        if self._xlsx is None:
+            return
+        for table in self.tables:
+            path = join(self.output_dir, f"{table}.csv")
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    self._xlsx.write(table, [row])
+
+    def write(self, table: str, rows: List[dict]):
+        for writer in self._writers[table]:
+            writer.write(rows)
+        if self._xlsx is not None:
+            self._xlsx.write(table, rows)
+        self.rows_written[table] += len(rows)
+
+    def close(self):
+        for writers in self._writers.values():
+            for writer in writers:
+                writer.close()
+        if self._xlsx is not None:
+            self._xlsx.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,171 @@
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from datacollection.metrics import metrics
+
+# Seconds a stored page is answered from disk without asking the API, per endpoint (the
+# last segment of the URL path). Older pages are revalidated with If-None-Match.
+DEFAULT_TTLS = {
+    "search": 24 * 3600,
+    "videos": 6 * 3600,
+    "commentThreads": 3600,
+}
+DEFAULT_TTL = 3600
+
+# Query parameters left out of the cache key, so a new API key does not empty the cache
+IGNORED_PARAMS = {"key"}
+
+
+class OfflineCacheMiss(RuntimeError):
+    pass
+
+
+class HttpCache:
+    """
+    Persistent store of GET responses keyed on the normalized request URL.
+
+    Every entry keeps the response headers (including the ETag), the body and when it
+    was last fetched or revalidated. In `offline` mode every stored response is served
+    regardless of its age and nothing is sent to the network. Entries older than
+    `max_age` seconds are dropped when the cache is opened.
+    """
+
+    def __init__(self, path: str = "http_cache.sqlite", ttls: dict = None, offline: bool = False,
+                 max_age: float = 30 * 24 * 3600):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.offline = offline
+        self.max_age = max_age
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                etag TEXT,
+                headers TEXT NOT NULL,
+                content BLOB NOT NULL,
+                fetched REAL NOT NULL
+            )""")
+        self._conn.commit()
+        if not offline:
+            self.evict()
+
+    @staticmethod
+    def make_key(uri: str) -> (str, str):
+        """
+        Return the cache key (URL with sorted query, without ignored parameters) and the endpoint
+        """
+        parts = urlsplit(uri)
+        query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                       if name not in IGNORED_PARAMS)
+        key = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+        return key, parts.path.rstrip("/").rsplit("/", 1)[-1]
+
+    def ttl(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, DEFAULT_TTL)
+
+    def get(self, key: str):
+        """
+        Return `(etag, headers, content, fetched)` or None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT etag, headers, content, fetched FROM responses WHERE key = ?",
+                                     (key,)).fetchone()
+        if row is None:
+            return None
+        etag, headers, content, fetched = row
+        return etag, json.loads(headers), content, fetched
+
+    def put(self, key: str, endpoint: str, headers: dict, content: bytes):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, endpoint, headers.get("etag"), json.dumps(headers), content, time.time()))
+            self._conn.commit()
+
+    def touch(self, key: str):
+        with self._lock:
+            self._conn.execute("UPDATE responses SET fetched = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+    def evict(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE fetched < ?", (time.time() - self.max_age,))
+            self._conn.commit()
+
+    def record(self, outcome: str, endpoint: str):
+        """
+        Count a `hits`, `revalidated` or `misses` outcome
+        """
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+        metrics.inc(f"http_cache_{outcome}", endpoint=endpoint)
+
+    def stats(self) -> str:
+        return f"HTTP cache: {self.hits} hits, {self.revalidated} revalidated, {self.misses} misses"
+
+    def close(self):
+        self._conn.close()
+
+
+class CachingHttp:
+    """
+    Drop-in for the httplib2.Http passed to googleapiclient's `request.execute(http=...)`.
+
+    GET requests younger than their endpoint's TTL are answered from the HttpCache. Older
+    ones are sent with If-None-Match, and a 304 answer reuses the stored body.
+    `from_cache` tells the caller whether the last request stayed off the network (and
+    so used no quota). Like httplib2.Http, an instance must only be used by one thread.
+    """
+
+    def __init__(self, http, cache: HttpCache):
+        self.http = http
+        self.cache = cache
+        self.from_cache = False
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+    @staticmethod
+    def _response(headers: dict):
+        import httplib2
+
+        return httplib2.Response(headers)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self.from_cache = False
+        if method != "GET":
+            return self.http.request(uri, method=method, body=body, headers=headers, **kwargs)
+
+        key, endpoint = HttpCache.make_key(uri)
+        entry = self.cache.get(key)
+        if entry is not None:
+            etag, stored_headers, content, fetched = entry
+            if self.cache.offline or time.time() - fetched < self.cache.ttl(endpoint):
+                self.from_cache = True
+                self.cache.record("hits", endpoint)
+                return self._response(stored_headers), content
+        if self.cache.offline:
+            self.cache.record("misses", endpoint)
+            raise OfflineCacheMiss(f"Offline mode: no cached response for {key}")
+
+        headers = dict(headers or {})
+        if entry is not None and entry[0]:
+            headers["If-None-Match"] = entry[0]
+        response, content = self.http.request(uri, method=method, body=body, headers=headers, **kwargs)
+
+        if response.status == 304 and entry is not None:
+            self.cache.touch(key)
+            self.cache.record("revalidated", endpoint)
+            return self._response(entry[1]), entry[2]
+
+        self.cache.record("misses", endpoint)
+        if response.status == 200:
+            self.cache.put(key, endpoint, dict(response), content)
+        return response, content
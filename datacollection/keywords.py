@@ -0,0 +1,235 @@
+import csv
+import html
+import json
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from glob import glob
+from os.path import join
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from datacollection.export import CSV_FIELD_SIZE_LIMIT  # noqa: F401 (raises csv's field size limit)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+TAG_RE = re.compile(r"<[^>]+>")
+MIN_TOKEN_LENGTH = 2
+
+
+@lru_cache(maxsize=1)
+def stop_words() -> frozenset:
+    """
+    NLTK's English stopwords, loaded once per process
+    """
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words('english'))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens without HTML markup, stopwords and single characters
+    """
+    # The Reddit tables store newlines as a literal `\\n`
+    text = html.unescape(TAG_RE.sub(" ", text.replace("\\n", " "))).lower()
+    stop = stop_words()
+    return [token for token in TOKEN_RE.findall(text) if len(token) >= MIN_TOKEN_LENGTH and token not in stop]
+
+
+def _sparse():
+    try:
+        import numpy as np
+        import scipy.sparse as sp
+    except ImportError:
+        raise ImportError("The keyword index requires numpy and scipy: `pip install numpy scipy`")
+    return np, sp
+
+
+class KeywordIndex:
+    """
+    Sparse document x term count matrix over the collected corpus, persisted in `directory`.
+
+    Every document carries group labels (e.g. the video URL, the subreddit, the source
+    table), and TF-IDF keywords are computed for every label of a group at once with
+    sparse matrix products. New documents are tokenized once and appended; the vocabulary
+    grows as needed and the existing rows are kept as they are.
+    """
+    matrix_filename = "counts.npz"
+    meta_filename = "index.json"
+
+    def __init__(self, directory: str = "keyword_index"):
+        self.np, self.sp = _sparse()
+        self.directory = directory
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.terms = []
+        self.vocabulary = {}
+        self.doc_ids = []
+        # group name -> one label per document (None where the document has no label)
+        self.groups = {}
+        # source file -> number of rows already indexed
+        self.sources = {}
+        self.counts = self.sp.csr_matrix((0, 0), dtype=self.np.int32)
+        self._known_ids = set()
+
+        meta_path = join(directory, KeywordIndex.meta_filename)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.terms = meta["terms"]
+            self.vocabulary = {term: column for column, term in enumerate(self.terms)}
+            self.doc_ids = meta["doc_ids"]
+            self.groups = meta["groups"]
+            self.sources = meta["sources"]
+            self.counts = self.sp.load_npz(join(directory, KeywordIndex.matrix_filename)).tocsr()
+            self._known_ids = set(self.doc_ids)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def add(self, documents: Iterable[Tuple[str, str, Dict[str, str]]]) -> int:
+        """
+        Tokenize and append `(doc_id, text, groups)` documents, skipping ids already indexed.
+
+        Returns the number of documents added.
+        """
+        np, sp = self.np, self.sp
+        indptr = [0]
+        indices = []
+        data = []
+        new_ids = []
+        new_groups = []
+        for doc_id, text, groups in documents:
+            if doc_id in self._known_ids:
+                continue
+            self._known_ids.add(doc_id)
+            for term, count in Counter(tokenize(text or "")).items():
+                column = self.vocabulary.get(term)
+                if column is None:
+                    column = self.vocabulary[term] = len(self.terms)
+                    self.terms.append(term)
+                indices.append(column)
+                data.append(count)
+            indptr.append(len(indices))
+            new_ids.append(doc_id)
+            new_groups.append(groups)
+        if not new_ids:
+            return 0
+
+        block = sp.csr_matrix((np.array(data, dtype=np.int32), np.array(indices, dtype=np.int64),
+                               np.array(indptr, dtype=np.int64)), shape=(len(new_ids), len(self.terms)))
+        existing = self.counts.copy()
+        existing.resize((existing.shape[0], len(self.terms)))
+        self.counts = sp.vstack([existing, block], format="csr")
+
+        for name in set(self.groups) | {name for groups in new_groups for name in groups}:
+            labels = self.groups.setdefault(name, [None] * len(self.doc_ids))
+            labels.extend(groups.get(name) for groups in new_groups)
+        self.doc_ids.extend(new_ids)
+        return len(new_ids)
+
+    def add_csv(self, path: str, text_columns: List[str], group_columns: Dict[str, str] = None,
+                labels: Dict[str, str] = None) -> int:
+        """
+        Index the rows of an exported (append-only) CSV table that were not indexed yet.
+
+        `text_columns` are joined into the document text, `group_columns` maps group names to
+        columns (e.g. {"video": "URL"}) and `labels` are fixed group labels for every row.
+        """
+        start = self.sources.get(path, 0)
+
+        def documents():
+            with open(path, "r", newline="", encoding="utf-8") as f:
+                for row_number, row in enumerate(csv.DictReader(f)):
+                    if row_number < start:
+                        continue
+                    groups = dict(labels or {})
+                    for name, column in (group_columns or {}).items():
+                        groups[name] = row.get(column)
+                    self.sources[path] = row_number + 1
+                    yield f"{path}#{row_number}", " ".join(row.get(column) or "" for column in text_columns), groups
+
+        return self.add(documents())
+
+    def tfidf(self):
+        """
+        L2-normalized TF-IDF weights with sublinear term frequency and smoothed IDF
+        """
+        np, sp = self.np, self.sp
+        weights = self.counts.astype(np.float64)
+        df = np.bincount(weights.indices, minlength=weights.shape[1])
+        idf = np.log((1 + weights.shape[0]) / (1 + df)) + 1
+        weights.data = 1 + np.log(weights.data)
+        weights = (weights @ sp.diags(idf)).tocsr()
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return (sp.diags(1 / norms) @ weights).tocsr()
+
+    def _top_terms(self, scores, row: int, top: int) -> List[Tuple[str, float]]:
+        np = self.np
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        data = scores.data[start:end]
+        columns = scores.indices[start:end]
+        best = np.argpartition(-data, top)[:top] if len(data) > top else np.arange(len(data))
+        best = best[np.argsort(-data[best])]
+        return [(self.terms[columns[i]], float(data[i])) for i in best]
+
+    def keywords(self, top: int = 12) -> List[Tuple[str, float]]:
+        """
+        Top TF-IDF terms over the whole corpus
+        """
+        scores = self.sp.csr_matrix(self.tfidf().sum(axis=0))
+        return self._top_terms(scores, 0, top)
+
+    def keywords_by(self, group: str, top: int = 12) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Top TF-IDF terms for every label of `group` (e.g. every video or every subreddit)
+        """
+        np, sp = self.np, self.sp
+        labels = self.groups.get(group)
+        if not labels:
+            return {}
+        values = sorted({label for label in labels if label is not None})
+        position = {value: i for i, value in enumerate(values)}
+        rows = [i for i, label in enumerate(labels) if label is not None]
+        # One indicator row per label; the product sums the document weights of each label
+        indicator = sp.csr_matrix((np.ones(len(rows)), ([position[labels[i]] for i in rows], rows)),
+                                  shape=(len(values), len(labels)))
+        scores = (indicator @ self.tfidf()).tocsr()
+        return {value: self._top_terms(scores, i, top) for i, value in enumerate(values)}
+
+    def save(self):
+        # Write both files next to the old ones first so a crash never leaves a half-written index
+        matrix_tmp = join(self.directory, "counts.tmp.npz")
+        meta_tmp = join(self.directory, KeywordIndex.meta_filename + ".tmp")
+        self.sp.save_npz(matrix_tmp, self.counts)
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump({"terms": self.terms, "doc_ids": self.doc_ids, "groups": self.groups,
+                       "sources": self.sources}, f)
+        os.replace(matrix_tmp, join(self.directory, KeywordIndex.matrix_filename))
+        os.replace(meta_tmp, join(self.directory, KeywordIndex.meta_filename))
+
+
+def update_from_exports(index: KeywordIndex, comment_dir: str = "Comment Archive",
+                        transcript_dir: str = "Transcript Record", reddit_dir: str = "./data") -> int:
+    """
+    Add the rows appended to the exported comment, transcript and Reddit tables since the
+    last update. Returns the number of new documents.
+    """
+    added = 0
+    comments = join(comment_dir, "comments.csv")
+    if os.path.exists(comments):
+        added += index.add_csv(comments, ["Comments"], {"video": "URL"}, {"source": "youtube_comments"})
+    transcripts = join(transcript_dir, "transcripts.csv")
+    if os.path.exists(transcripts):
+        added += index.add_csv(transcripts, ["Title", "Transcript"], {"video": "URL"},
+                               {"source": "youtube_transcripts"})
+    # <reddit_dir>/<subreddit>/<run_id>/<table>.csv
+    for path in sorted(glob(join(reddit_dir, "*", "*", "submissions.csv"))):
+        subreddit = Path(path).parent.parent.name
+        added += index.add_csv(path, ["title", "selftext"], labels={"subreddit": subreddit,
+                                                                    "source": "reddit_submissions"})
+    for path in sorted(glob(join(reddit_dir, "*", "*", "comments.csv"))):
+        subreddit = Path(path).parent.parent.name
+        added += index.add_csv(path, ["body"], labels={"subreddit": subreddit, "source": "reddit_comments"})
+    return added
@@ -0,0 +1,57 @@
+import os
+import threading
+
+from datacollection.llm_cache import LLMCache
+
+# Point at the ATR lab server machine; OLLAMA_BASE_URL overrides it with one or more
+# comma-separated servers (e.g. a second GPU box or the benchmark stub)
+DEFAULT_BASE_URL = "http://131.123.41.132:11434"
+DEFAULT_MODEL = "llava:34b"
+# Prompts in flight per server
+HOST_CONCURRENCY = 2
+# Reruns answer repeated prompts from disk instead of calling the LLM again
+CACHE_PATH = "llm_cache.sqlite"
+
+_lock = threading.Lock()
+_llm = None
+_cache = None
+
+
+def base_urls() -> str:
+    return os.environ.get("OLLAMA_BASE_URL", DEFAULT_BASE_URL)
+
+
+def get_llm():
+    """
+    Process-wide LLMPool, built on first use so importing the collectors stays cheap
+    """
+    global _llm
+    with _lock:
+        if _llm is None:
+            from datacollection.llm_pool import pool_from_env
+
+            _llm = pool_from_env(base_urls(), DEFAULT_MODEL, per_host_concurrency=HOST_CONCURRENCY)
+        return _llm
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = LLMCache(CACHE_PATH)
+        return _cache
+
+
+def close():
+    """
+    Shut down the pool and close the cache; the next `get_llm`/`get_llm_cache` builds new ones
+    """
+    global _llm, _cache
+    with _lock:
+        if _llm is not None:
+            _llm.shutdown()
+            _llm = None
+        if _cache is not None:
+            print(_cache.stats())
+            _cache.close()
+            _cache = None
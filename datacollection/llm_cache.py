@@ -0,0 +1,125 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from datacollection.metrics import metrics
+
+
+class LLMCache:
+    """
+    Persistent, content-addressed cache for LLM completions.
+
+    Entries are keyed on a hash of (model, base_url, prompt template, input text), so a
+    changed prompt or model never returns a stale answer. Eviction keeps at most
+    `max_entries` rows (least recently used first) and drops rows older than `max_age`
+    seconds.
+    """
+
+    def __init__(self, path: str = "llm_cache.sqlite", max_entries: int = 100_000,
+                 max_age: float = 90 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(model: str, base_url: str, template: str, text: str) -> str:
+        payload = json.dumps([model, base_url, template, text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM completions WHERE key = ?",
+                                     (key,)).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)",
+                               (key, response, now, now))
+            self._conn.commit()
+
+    def evict(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completions WHERE created < ?",
+                               (time.time() - self.max_age,))
+            self._conn.execute("""
+                DELETE FROM completions WHERE key IN (
+                    SELECT key FROM completions ORDER BY accessed DESC LIMIT -1 OFFSET ?
+                )""", (self.max_entries,))
+            self._conn.commit()
+
+    def stats(self) -> str:
+        return f"LLM cache: {self.hits} hits, {self.misses} misses"
+
+    def close(self):
+        self.evict()
+        self._conn.close()
+
+
+def cached_submit(llm, cache: LLMCache, template: str, text: str) -> Future:
+    """
+    Fill `template` (a prompt with a `{text}` placeholder) and send it to the LLM, unless
+    the same model/server/template/text was already answered.
+
+    Returns a Future. With an `LLMPool` the prompt is queued and the caller is not
+    blocked; a plain LLM object is invoked synchronously.
+    """
+    key = LLMCache.make_key(llm.model, llm.base_url, template, text)
+    response = cache.get(key)
+    if response is not None:
+        metrics.inc("llm_cache_hits", model=llm.model)
+        future = Future()
+        future.set_result(response)
+        return future
+
+    prompt = template.format(text=text)
+
+    def store(done: Future):
+        if done.exception() is None:
+            metrics.inc("llm_calls", model=llm.model)
+            metrics.inc("llm_input_chars", len(prompt), model=llm.model)
+            metrics.inc("llm_output_chars", len(done.result()), model=llm.model)
+            cache.put(key, done.result())
+
+    if hasattr(llm, "submit"):
+        future = llm.submit(prompt)
+    else:
+        future = Future()
+        try:
+            with metrics.time("llm.invoke"):
+                future.set_result(llm.invoke(prompt))
+        except Exception as e:
+            future.set_exception(e)
+    future.add_done_callback(store)
+    return future
+
+
+def cached_invoke(llm, cache: LLMCache, template: str, text: str) -> str:
+    """
+    Blocking version of `cached_submit`
+    """
+    return cached_submit(llm, cache, template, text).result()
@@ -0,0 +1,140 @@
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from datacollection.metrics import metrics
+
+
+# langchain's Ollama reports HTTP errors as "Ollama call failed with status code 500. Details: ..."
+STATUS_RE = re.compile(r"status code (\d{3})")
+
+
+class AllHostsDown(RuntimeError):
+    pass
+
+
+def is_host_error(error: Exception) -> bool:
+    """
+    Whether `error` says the host is unreachable or broken (connection, timeout, 5xx), as
+    opposed to the prompt itself being refused (4xx, context overflow...), which would fail
+    on every host
+    """
+    import requests
+
+    if isinstance(error, (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout)):
+        return True
+    match = STATUS_RE.search(str(error))
+    return match is not None and int(match.group(1)) >= 500
+
+
+class _Host:
+    def __init__(self, base_url: str, model: str, concurrency: int):
+        # langchain is slow to import, so it is only loaded once a pool is built
+        from langchain_community.llms import Ollama
+
+        self.base_url = base_url
+        self.llm = Ollama(base_url=base_url, model=model)
+        self.concurrency = concurrency
+        self.outstanding = 0
+        self.down_until = 0.0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        return self.down_until <= now and self.outstanding < self.concurrency
+
+
+class LLMPool:
+    """
+    Dispatch prompts to several Ollama hosts serving the same model.
+
+    `submit` returns a Future right away; prompts are routed to the healthy host with the
+    fewest outstanding requests, at most `per_host_concurrency` at a time per host. A host
+    that fails (see `is_host_error`) is taken out of rotation for `cooldown` seconds and the
+    prompt is retried on another one; other errors are raised to the caller right away. Once `max_pending` prompts are queued, `submit` blocks, which slows the
+    producers down instead of queueing without bound.
+
+    `invoke` keeps the blocking `llm.invoke` interface, and `base_url` is the first host so
+    cache keys do not change when hosts are added.
+    """
+
+    def __init__(self, base_urls: List[str], model: str, per_host_concurrency: int = 2,
+                 max_pending: int = 64, cooldown: float = 30.0, max_attempts: int = None):
+        if not base_urls:
+            raise ValueError("LLMPool needs at least one Ollama base_url")
+        self.model = model
+        self.base_url = base_urls[0]
+        self.cooldown = cooldown
+        self.max_attempts = max_attempts or 2 * len(base_urls)
+        self.hosts = [_Host(url, model, per_host_concurrency) for url in base_urls]
+        self._condition = threading.Condition()
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=per_host_concurrency * len(base_urls),
+                                            thread_name_prefix="llm")
+
+    def _acquire_host(self) -> _Host:
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                candidates = [host for host in self.hosts if host.available(now)]
+                if candidates:
+                    host = min(candidates, key=lambda h: h.outstanding)
+                    host.outstanding += 1
+                    return host
+                if all(host.down_until > now for host in self.hosts):
+                    wake_up = min(host.down_until for host in self.hosts)
+                    self._condition.wait(timeout=wake_up - now)
+                else:
+                    self._condition.wait()
+
+    def _release_host(self, host: _Host, failed: bool):
+        with self._condition:
+            host.outstanding -= 1
+            if failed:
+                host.failures += 1
+                host.down_until = time.monotonic() + self.cooldown
+            else:
+                host.failures = 0
+            self._condition.notify_all()
+
+    def _run(self, prompt: str) -> str:
+        last_error = None
+        for _ in range(self.max_attempts):
+            host = self._acquire_host()
+            try:
+                with metrics.time("llm.invoke"):
+                    response = host.llm.invoke(prompt)
+            except Exception as e:
+                if not is_host_error(e):
+                    # The host answered, so it stays in rotation
+                    self._release_host(host, failed=False)
+                    raise
+                self._release_host(host, failed=True)
+                metrics.inc("llm_failovers", host=host.base_url)
+                last_error = e
+                continue
+            self._release_host(host, failed=False)
+            metrics.inc("llm_host_calls", host=host.base_url)
+            return response
+        raise AllHostsDown(f"LLM prompt failed on every host: {last_error}") from last_error
+
+    def submit(self, prompt: str) -> Future:
+        # Backpressure: block the producer while `max_pending` prompts are in flight
+        self._pending.acquire()
+        future = self._executor.submit(self._run, prompt)
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def invoke(self, prompt: str) -> str:
+        return self.submit(prompt).result()
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
+def pool_from_env(value: str, model: str, **kwargs) -> LLMPool:
+    """
+    Build a pool from a comma-separated list of base urls (e.g. $OLLAMA_BASE_URL)
+    """
+    return LLMPool([url.strip() for url in value.split(",") if url.strip()], model, **kwargs)
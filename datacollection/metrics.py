@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from os.path import join
+from pathlib import Path
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float("inf"))
+
+PROMETHEUS_PREFIX = "datacollection"
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket containing the q-quantile
+        """
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    Thread-safe registry of per-stage latency histograms and labelled counters
+    (requests, retries, LLM characters, YouTube quota units...) for one run
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new run: a scheduler or the `--wait-for-quota` loop runs several in one process
+        """
+        with self._lock:
+            self.started = time.time()
+            self.histograms = {}
+            self.counters = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.histograms[stage].observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def counter(self, name: str, **labels) -> float:
+        """
+        Value of a counter, summed over every label set matching `labels`
+        """
+        with self._lock:
+            return sum(value for (counter_name, counter_labels), value in self.counters.items()
+                       if counter_name == name and set(labels.items()) <= set(counter_labels))
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "started": self.started,
+                "elapsed_seconds": time.time() - self.started,
+                "stages": {
+                    stage: {
+                        "count": histogram.count,
+                        "total_seconds": histogram.sum,
+                        "mean_seconds": histogram.sum / histogram.count if histogram.count else 0.0,
+                        "p50_seconds": histogram.quantile(0.5),
+                        "p95_seconds": histogram.quantile(0.95),
+                        "max_seconds": histogram.max,
+                    }
+                    for stage, histogram in sorted(self.histograms.items())
+                },
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+            }
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            name = f"{PROMETHEUS_PREFIX}_stage_seconds"
+            lines.append(f"# HELP {name} Latency of each collection stage")
+            lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+            declared = set()
+            for (counter_name, labels), value in sorted(self.counters.items()):
+                name = f"{PROMETHEUS_PREFIX}_{counter_name}_total"
+                if name not in declared:
+                    lines.append(f"# TYPE {name} counter")
+                    declared.add(name)
+                label_text = ",".join(f'{key}="{label_value}"' for key, label_value in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_dir: str, name: str = "metrics"):
+        """
+        Write `<name>.json` (run report) and `<name>.prom` (Prometheus textfile) to `output_dir`
+        """
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        with open(join(output_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        with open(join(output_dir, f"{name}.prom"), "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+
+    def finish(self, output_dir: str) -> str:
+        """
+        Write the run report (metrics.json) and Prometheus textfile (metrics.prom) next to
+        the outputs of the run, and return the summary to print
+        """
+        self.write(output_dir)
+        return self.summary()
+
+    def summary(self) -> str:
+        report = self.report()
+        lines = [f"Run took {report['elapsed_seconds']:.1f}s"]
+        for stage, stats in report["stages"].items():
+            lines.append(f"  {stage}: {stats['count']} calls, {stats['total_seconds']:.1f}s total, "
+                         f"p50 {stats['p50_seconds']:.2f}s, p95 {stats['p95_seconds']:.2f}s")
+        return "\n".join(lines)
+
+
+# Shared by every module of a run
+metrics = Metrics()
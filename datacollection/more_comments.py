@@ -0,0 +1,108 @@
+import time
+from heapq import heappop, heappush
+from itertools import count
+from typing import List, Optional
+
+from datacollection.metrics import metrics
+
+# Which MoreComments stub is expanded next: the one hiding the most comments, or the one
+# closest to the submission
+PRIORITIES = ("count", "depth")
+
+
+class ExpansionBudget:
+    """
+    Limits for expanding the MoreComments stubs of one submission: at most `max_requests`
+    expansions (None for no limit) and `max_seconds` of wall-clock time, in `priority` order
+    """
+
+    def __init__(self, max_requests: Optional[int] = 32, max_seconds: float = 60.0, priority: str = "count"):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown expansion priority `{priority}`, use one of {list(PRIORITIES)}")
+        self.max_requests = max_requests
+        self.max_seconds = max_seconds
+        self.priority = priority
+
+
+class Expansion:
+    """
+    What expanding one submission produced: the comments (Comment objects, no stubs),
+    the number of requests spent, and one record per stub left unexpanded
+    """
+
+    def __init__(self):
+        self.comments = []
+        self.unexpanded = []
+        self.requests = 0
+        self.seconds = 0.0
+
+
+def _is_more(item) -> bool:
+    # Checked by class name: asking a praw Comment for a missing attribute fetches it from Reddit
+    return type(item).__name__.endswith("MoreComments")
+
+
+def _priority(more, priority: str) -> tuple:
+    depth = getattr(more, "depth", 0) or 0
+    return (-more.count, depth) if priority == "count" else (depth, -more.count)
+
+
+def expand_comments(submission, budget: ExpansionBudget) -> Expansion:
+    """
+    Load the comments of a praw Submission, expanding its MoreComments stubs best first
+    (see ExpansionBudget.priority) instead of in tree order, until the request or time
+    budget is spent. Stubs found inside expanded ones join the queue.
+
+    Unlike `replace_more`, the tree itself is not rebuilt; the flat comment list is what
+    the caller stores (parents are linked by `parent_id`).
+    """
+    start = time.monotonic()
+    expansion = Expansion()
+    seen = set()
+    queue = []
+    # Ties are expanded in the order the stubs were found
+    order = count()
+
+    def add(items):
+        for item in items:
+            if _is_more(item):
+                if getattr(item, "submission", None) is None:
+                    item.submission = submission
+                heappush(queue, (_priority(item, budget.priority), next(order), item))
+            elif item.id not in seen:
+                seen.add(item.id)
+                expansion.comments.append(item)
+
+    add(submission.comments.list())
+    while queue:
+        _, _, more = heappop(queue)
+        elapsed = time.monotonic() - start
+        if (budget.max_requests is not None and expansion.requests >= budget.max_requests) \
+                or elapsed >= budget.max_seconds:
+            expansion.unexpanded.append(_unexpanded_record(submission, more))
+            continue
+        with metrics.time("reddit.more_comments"):
+            loaded = more.comments(update=False)
+        expansion.requests += 1
+        # "continue this thread" stubs return a CommentForest, morechildren a flat list
+        add(loaded.list() if hasattr(loaded, "list") else loaded)
+
+    expansion.seconds = time.monotonic() - start
+    metrics.inc("more_comments_expanded", expansion.requests)
+    metrics.inc("comments_unexpanded", unexpanded_total(expansion.unexpanded))
+    return expansion
+
+
+def _unexpanded_record(submission, more) -> dict:
+    return {
+        "submission_id": submission.id,
+        "parent_id": more.parent_id,
+        "depth": getattr(more, "depth", None),
+        "count": more.count,
+        # Enough to expand the stub later through /api/morechildren
+        "children": " ".join(more.children),
+    }
+
+
+def unexpanded_total(records: List[dict]) -> int:
+    return sum(record["count"] for record in records)
@@ -0,0 +1,50 @@
+import queue
+import threading
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def prefetch(iterable, max_pending: int = 16):
+    """
+    Consume `iterable` on a background thread and yield its items in order.
+
+    The producer runs ahead of the consumer by at most `max_pending` items, so a slow
+    downstream stage (LLM calls) overlaps with a slow upstream one (API paging) without
+    buffering the whole run. Exceptions raised by the producer are re-raised here.
+    """
+    items = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            items.put(_DONE)
+        except BaseException as e:
+            items.put(_Failure(e))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # Unblock the producer if the consumer stops early
+        stop.set()
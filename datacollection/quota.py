@@ -0,0 +1,174 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, time as clock_time, timedelta, timezone
+from typing import List, Optional
+
+from datacollection.metrics import metrics
+
+# Default daily quota of a YouTube Data API project
+DAILY_QUOTA = 10000
+
+
+def _pacific():
+    # The quota resets at midnight Pacific time; Windows has no tz database without the tzdata package
+    try:
+        from zoneinfo import ZoneInfo
+
+        return ZoneInfo("America/Los_Angeles")
+    except Exception:
+        return timezone(timedelta(hours=-8))
+
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+
+class QuotaBudget:
+    """
+    The YouTube Data API units spent today, persisted so every run of the day draws from
+    the same `daily_limit`.
+
+    Also keeps the remaining work of sweeps that were paused when the budget ran out,
+    keyed on the collector kind and a job name (the search keyword): the videos planned
+    but not done, and where their search stopped, so the next run resumes them instead
+    of searching again from the first page.
+    """
+
+    def __init__(self, path: str = "quota.sqlite", daily_limit: int = DAILY_QUOTA):
+        self.path = path
+        self.daily_limit = daily_limit
+        self._tz = _pacific()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS usage (
+                day TEXT PRIMARY KEY,
+                units INTEGER NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                videos TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (kind, name)
+            )""")
+        # Jobs saved before searches could be resumed have no search column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "search" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN search TEXT")
+        self._conn.commit()
+
+    def _today(self) -> str:
+        return datetime.now(self._tz).date().isoformat()
+
+    def used(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT units FROM usage WHERE day = ?", (self._today(),)).fetchone()
+        return row[0] if row is not None else 0
+
+    def remaining(self) -> int:
+        return max(0, self.daily_limit - self.used())
+
+    def spend(self, units: int):
+        """
+        Take `units` from today's budget before a call, or raise QuotaExceeded if they do not fit
+        """
+        day = self._today()
+        with self._lock:
+            row = self._conn.execute("SELECT units FROM usage WHERE day = ?", (day,)).fetchone()
+            used = row[0] if row is not None else 0
+            if used + units > self.daily_limit:
+                metrics.inc("quota_exhausted")
+                raise QuotaExceeded(f"YouTube quota exhausted: {used} of {self.daily_limit} units used today")
+            self._conn.execute("INSERT OR REPLACE INTO usage VALUES (?, ?)", (day, used + units))
+            self._conn.commit()
+
+    def refund(self, units: int):
+        # The call did not reach the API (e.g. answered from the HTTP cache)
+        with self._lock:
+            self._conn.execute("UPDATE usage SET units = MAX(0, units - ?) WHERE day = ?", (units, self._today()))
+            self._conn.commit()
+
+    def exhaust(self):
+        # The API said the quota is gone (e.g. another tool shares the project), so trust it over our count
+        with self._lock:
+            self._conn.execute("INSERT INTO usage VALUES (?, ?) ON CONFLICT(day) DO UPDATE SET units = MAX(units, ?)",
+                               (self._today(), self.daily_limit, self.daily_limit))
+            self._conn.commit()
+
+    def seconds_until_reset(self) -> float:
+        now = datetime.now(self._tz)
+        midnight = datetime.combine(now.date() + timedelta(days=1), clock_time(0), tzinfo=self._tz)
+        # A minute of slack so the first request after waking up is not refused
+        return (midnight - now).total_seconds() + 60
+
+    def wait_for_reset(self):
+        wait = self.seconds_until_reset()
+        print(f"Waiting {wait / 3600:.1f} hours for the YouTube quota to reset")
+        time.sleep(wait)
+
+    def load_job(self, kind: str, name: str) -> Optional[List[dict]]:
+        with self._lock:
+            row = self._conn.execute("SELECT videos FROM jobs WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def load_search(self, kind: str, name: str) -> Optional[dict]:
+        # Where the job's search stopped, or None when it returned every result
+        with self._lock:
+            row = self._conn.execute("SELECT search FROM jobs WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+        return json.loads(row[0]) if row is not None and row[0] is not None else None
+
+    def save_job(self, kind: str, name: str, videos: List[dict], search: dict = None):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO jobs (kind, name, videos, updated_at, search) "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               (kind, name, json.dumps(videos), time.time(),
+                                json.dumps(search) if search is not None else None))
+            self._conn.commit()
+
+    def finish_job(self, kind: str, name: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE kind = ? AND name = ?", (kind, name))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class QuotaReservations:
+    """
+    Units promised to work that was started but has not spent them all yet, so the next
+    piece of work only starts when its whole estimate still fits into today's budget.
+
+    Units a running job has already spent are counted twice (used and reserved) until
+    it is released, so near the end of the budget this waits rather than overcommits.
+    """
+
+    def __init__(self, budget: QuotaBudget):
+        self.budget = budget
+        self.reserved = 0
+        # Set once a reservation did not fit even with nothing else running
+        self.refused = False
+        self._condition = threading.Condition()
+
+    def reserve(self, units: int) -> bool:
+        """
+        Wait until `units` fit next to the running reservations. Returns False, without
+        waiting, when they do not fit even though nothing else is reserved.
+        """
+        with self._condition:
+            while self.reserved + units > self.budget.remaining():
+                if self.reserved == 0:
+                    self.refused = True
+                    return False
+                self._condition.wait()
+            self.reserved += units
+            return True
+
+    def release(self, units: int):
+        with self._condition:
+            self.reserved -= units
+            self._condition.notify_all()
@@ -0,0 +1,64 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker hitting the same API.
+
+    `rate` tokens are added per second up to `capacity`; `acquire` blocks until
+    enough tokens are available.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: float = 1):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Exponential backoff with full jitter
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def call_with_retry(func, is_retryable, bucket: TokenBucket = None, max_retries: int = 5,
+                    backoff_base: float = 1.0, on_retry=None):
+    """
+    Call `func()` and retry it while `is_retryable(exception)` says so.
+
+    Every attempt (retries included) takes a token from `bucket` when one is given;
+    `on_retry(exception)` is called before each retry.
+    """
+    attempt = 0
+    while True:
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            if on_retry is not None:
+                on_retry(e)
+            time.sleep(backoff_delay(attempt, backoff_base))
+            attempt += 1
@@ -0,0 +1,148 @@
+import gzip
+import json
+import os
+from typing import List
+
+# Fields kept from the raw Pushshift submission dicts and the PRAW comment objects.
+# Everything else (PRAW client references, lazily-loaded objects...) is dropped.
+SUBMISSION_FIELDS = [
+    "id", "subreddit", "author", "created_utc", "retrieved_on", "title", "selftext", "url", "full_link",
+    "permalink", "domain", "score", "num_comments", "upvote_ratio", "over_18", "is_self", "stickied",
+    "locked", "link_flair_text", "removed_by_category",
+]
+COMMENT_FIELDS = [
+    "id", "link_id", "parent_id", "subreddit", "author", "created_utc", "edited", "body", "score",
+    "controversiality", "distinguished", "is_submitter", "stickied", "permalink", "depth",
+]
+
+EXTENSIONS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst", "none": ".jsonl"}
+
+
+def to_record(obj, fields: List[str]) -> dict:
+    """
+    Project a dict or an object (PRAW model) on `fields`, turning anything that is not
+    plain JSON (e.g. a Redditor) into its string form
+    """
+    record = {}
+    for field in fields:
+        value = obj.get(field) if isinstance(obj, dict) else getattr(obj, field, None)
+        if value is not None and not isinstance(value, (str, int, float, bool)):
+            value = str(value)
+        record[field] = value
+    return record
+
+
+def _compressor(compression: str):
+    if compression == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression requires zstandard: `pip install zstandard`")
+        return zstandard.ZstdCompressor(level=10).compress
+    if compression == "none":
+        return lambda data: data
+    raise ValueError(f"Unknown compression `{compression}`, use one of {list(EXTENSIONS)}")
+
+
+def _decompressor(compression: str):
+    if compression == "gzip":
+        return gzip.decompress
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress
+    return lambda data: data
+
+
+def compression_of(path: str) -> str:
+    for compression, extension in EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    raise ValueError(f"Unknown raw archive extension: {path}")
+
+
+class RawArchiveWriter:
+    """
+    Append-only archive of newline-delimited JSON records with a fixed field schema.
+
+    Records are compressed in blocks of `block_records`; every block is an independent
+    gzip member / zstd frame, so the file is still a valid `.gz`/`.zst` stream for
+    zcat/zstdcat. A sidecar `<file>.idx` maps every record id to its block offset,
+    block length and line number, which lets `RawArchiveReader.get` decompress a single
+    block instead of the whole file.
+    """
+
+    def __init__(self, path_prefix: str, fields: List[str], compression: str = "gzip",
+                 key: str = "id", block_records: int = 256):
+        self.path = path_prefix + EXTENSIONS[compression]
+        self.index_path = self.path + ".idx"
+        self.fields = fields
+        self.key = key
+        self.block_records = block_records
+        self._compress = _compressor(compression)
+        self._buffer = []
+        self._file = open(self.path, "ab")
+        self._index = open(self.index_path, "a", encoding="utf-8")
+
+    def write(self, obj):
+        self._buffer.append(to_record(obj, self.fields))
+        if len(self._buffer) >= self.block_records:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in self._buffer)
+        block = self._compress(payload.encode("utf-8"))
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(block)
+        self._file.flush()
+        self._index.write("".join(f"{record[self.key]}\t{offset}\t{len(block)}\t{line}\n"
+                                  for line, record in enumerate(self._buffer)))
+        self._index.flush()
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        self._index.close()
+
+
+class RawArchiveReader:
+    """
+    Read records back from a `RawArchiveWriter` file, either by id or all in order
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._decompress = _decompressor(compression_of(path))
+        self._index = {}
+        with open(path + ".idx", "r", encoding="utf-8") as f:
+            for row in f:
+                record_id, offset, length, line = row.rstrip("\n").split("\t")
+                self._index[record_id] = (int(offset), int(length), int(line))
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, record_id) -> bool:
+        return record_id in self._index
+
+    def _read_block(self, f, offset: int, length: int) -> List[str]:
+        f.seek(offset)
+        # Not splitlines(): it also splits on U+2028, U+2029 and U+0085, which json.dumps
+        # leaves raw with ensure_ascii=False. Every record ends with "\n".
+        return self._decompress(f.read(length)).decode("utf-8").split("\n")[:-1]
+
+    def get(self, record_id: str) -> dict:
+        offset, length, line = self._index[record_id]
+        with open(self.path, "rb") as f:
+            return json.loads(self._read_block(f, offset, length)[line])
+
+    def __iter__(self):
+        blocks = sorted({(offset, length) for offset, length, _ in self._index.values()})
+        with open(self.path, "rb") as f:
+            for offset, length in blocks:
+                for line in self._read_block(f, offset, length):
+                    yield json.loads(line)
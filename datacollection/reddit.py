@@ -0,0 +1,560 @@
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime
+from os.path import join
+from pathlib import Path
+from typing import Optional
+
+import yaml
+from codetiming import Timer
+from loguru import logger
+
+from datacollection.collected_index import CollectedIndex
+from datacollection.comment_forest import CommentForest, ForestWriter
+from datacollection.export import StreamingExporter
+from datacollection.metrics import metrics
+from datacollection.more_comments import ExpansionBudget, expand_comments
+from datacollection.ratelimit import TokenBucket
+from datacollection.raw_archive import COMMENT_FIELDS, SUBMISSION_FIELDS, RawArchiveWriter, to_record
+from datacollection.shards import ShardCheckpoint, shard_key, split_window
+
+
+class OutputManager:
+    """
+    Class used to collect and store data (submissions and comments)
+    """
+    params_filename = "params.yaml"
+    checkpoint_filename = "checkpoint.yaml"
+    collected_index_filename = "collected_index.sqlite"
+    excel_filename = "RedditArchive.xlsx"
+    forests_filename = "forests.bin"
+    export_tables = {
+        "submissions": ["id", "created_utc", "title", "selftext", "full_link"],
+        "comments": ["id", "submission_id", "body", "created_utc", "parent_id", "permalink"],
+        # MoreComments stubs left when the expansion budget of a submission ran out
+        "unexpanded": ["submission_id", "parent_id", "depth", "count", "children"],
+    }
+    export_sheets = {"submissions": "Submissions", "comments": "Comments", "unexpanded": "Unexpanded"}
+
+    def __init__(self, output_dir: str, subreddit: str, export_formats=("csv",), run_id: str = None,
+                 raw_compression: str = "gzip", xlsx: bool = True):
+        # Reusing the run_id of an interrupted run resumes it in the same directory
+        self.run_id = run_id or datetime.today().strftime('%Y%m%d%H%M%S')
+
+        self.subreddit_dir = join(output_dir, subreddit)
+        self.runtime_dir = join(self.subreddit_dir, self.run_id)
+
+        self.submissions_output = join(self.runtime_dir, "submissions")
+        self.sub_raw_output = join(self.runtime_dir, "submissions", "raw")
+        self.comments_output = join(self.runtime_dir, "comments")
+        self.comments_raw_output = join(self.runtime_dir, "comments", "raw")
+        self.params_path = join(self.runtime_dir, OutputManager.params_filename)
+        self.checkpoint_path = join(self.runtime_dir, OutputManager.checkpoint_filename)
+        self.excel_path = join(self.runtime_dir, OutputManager.excel_filename)
+
+        self.total_submissions_counter = 0
+        self.total_comments_counter = 0
+        self.utc_older = None
+        self.utc_newer = None
+        self._lock = threading.Lock()
+
+        for path in [self.submissions_output,
+                     self.sub_raw_output,
+                     self.comments_output,
+                     self.comments_raw_output]:
+            Path(path).mkdir(parents=True, exist_ok=True)
+
+        self.checkpoint = ShardCheckpoint(self.checkpoint_path)
+
+        # Shared by every run on this subreddit, so later runs skip what was already stored
+        self.collected_index = CollectedIndex(join(self.subreddit_dir, OutputManager.collected_index_filename))
+
+        # Compressed, indexed archives of the raw submissions and comments
+        self.submissions_raw_archive = RawArchiveWriter(join(self.sub_raw_output, "submissions"),
+                                                        SUBMISSION_FIELDS, raw_compression)
+        self.comments_raw_archive = RawArchiveWriter(join(self.comments_raw_output, "comments"),
+                                                     COMMENT_FIELDS, raw_compression)
+        # Columnar comment tree of every submission, see datacollection/comment_forest.py
+        self.forest_writer = ForestWriter(join(self.comments_output, OutputManager.forests_filename))
+
+        # Every batch is appended to disk as soon as it is fetched
+        self.exporter = StreamingExporter(self.runtime_dir, OutputManager.export_tables, export_formats,
+                                          xlsx_path=self.excel_path if xlsx else None,
+                                          sheets=OutputManager.export_sheets)
+        if run_id:
+            # xlsxwriter cannot append, so the resumed workbook is rebuilt from the CSV tables
+            self.exporter.copy_csv_to_xlsx()
+
+    def store(self, data: "SubmissionData"):
+        """
+        Store one fetched batch; called concurrently by the shard workers
+        """
+        with self._lock:
+            # Track total data statistics
+            self.total_submissions_counter += len(data.submissions_list)
+            self.total_comments_counter += len(data.comments_list)
+            for row in data.submissions_list:
+                self.utc_older, self.utc_newer = utc_range_calculator(
+                    int(row["created_utc"]), self.utc_newer, self.utc_older)
+
+            # Store the collected data
+            self.exporter.write("submissions", data.submissions_list)
+            self.exporter.write("comments", data.comments_list)
+            self.exporter.write("unexpanded", data.unexpanded_list)
+
+            for row in data.submissions_raw_list:
+                self.submissions_raw_archive.write(row)
+            for row in data.comments_raw_list:
+                self.comments_raw_archive.write(row)
+            for forest in data.forests:
+                self.forest_writer.write(forest)
+            # Make the raw records durable before the checkpoint moves past this batch
+            self.submissions_raw_archive.flush()
+            self.comments_raw_archive.flush()
+            self.forest_writer.flush()
+
+            self.collected_index.add("reddit_submission", [row["id"] for row in data.submissions_list])
+            self.collected_index.add("reddit_comment", [row["id"] for row in data.comments_list])
+
+    def close(self):
+        self.submissions_raw_archive.close()
+        self.comments_raw_archive.close()
+        self.forest_writer.close()
+        self.exporter.close()
+        self.collected_index.close()
+
+    def store_params(self, params: dict):
+        with open(self.params_path, "w", encoding="utf-8") as f:
+            yaml.dump(params, f)
+
+    def load_params(self) -> dict:
+        with open(self.params_path, "r", encoding="utf-8") as f:
+            params = yaml.load(f, yaml.FullLoader)
+        return params
+
+    def enrich_and_store_params(self):
+        params = self.load_params()
+        params["utc_older"] = self.utc_older
+        params["utc_newer"] = self.utc_newer
+        params["total_comments_counter"] = self.total_comments_counter
+        params["total_submissions_counter"] = self.total_submissions_counter
+        params["total_counter"] = self.total_comments_counter + self.total_submissions_counter
+        self.store_params(params)
+
+
+class SubmissionData:
+    """
+    Data fetched for a single submission by a worker thread, merged into the
+    OutputManager in submission order
+    """
+
+    def __init__(self):
+        self.submissions_list = []
+        self.submissions_raw_list = []
+        self.comments_list = []
+        self.comments_raw_list = []
+        self.unexpanded_list = []
+        self.forests = []
+
+    def merge(self, data: "SubmissionData"):
+        self.submissions_list.extend(data.submissions_list)
+        self.submissions_raw_list.extend(data.submissions_raw_list)
+        self.comments_list.extend(data.comments_list)
+        self.comments_raw_list.extend(data.comments_raw_list)
+        self.unexpanded_list.extend(data.unexpanded_list)
+        self.forests.extend(data.forests)
+
+
+_requestor_class = None
+
+
+def rate_limited_requestor_class():
+    """
+    prawcore Requestor taking a token from a shared bucket before every HTTP request.
+
+    The class is defined on first use so prawcore is only imported by runs that need it.
+    """
+    global _requestor_class
+    if _requestor_class is None:
+        from prawcore import Requestor
+        from prawcore.exceptions import RequestException
+        from prawcore.sessions import Session
+
+        class RateLimitedRequestor(Requestor):
+            def __init__(self, *args, bucket: TokenBucket = None, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.bucket = bucket
+
+            def request(self, *args, **kwargs):
+                if self.bucket is not None:
+                    self.bucket.acquire()
+                metrics.inc("reddit_requests")
+                try:
+                    with metrics.time("reddit.api"):
+                        response = super().request(*args, **kwargs)
+                except RequestException as e:
+                    # The failures prawcore's Session retries (each attempt is a request here too)
+                    if isinstance(e.original_exception, Session.RETRY_EXCEPTIONS):
+                        metrics.inc("retries", api="reddit")
+                    raise
+                if response.status_code in Session.RETRY_STATUSES:
+                    metrics.inc("retries", api="reddit")
+                return response
+
+        _requestor_class = RateLimitedRequestor
+    return _requestor_class
+
+
+class RedditClients:
+    """
+    One praw.Reddit instance per worker thread (PRAW is not thread-safe), all of them
+    drawing from a single rate budget since Reddit limits requests per OAuth client
+    """
+
+    def __init__(self, reddit_id: str, reddit_secret: str, reddit_username: str, requests_per_minute: int):
+        self.reddit_id = reddit_id
+        self.reddit_secret = reddit_secret
+        self.reddit_username = reddit_username
+        self.bucket = TokenBucket(rate=requests_per_minute / 60, capacity=10)
+        self._local = threading.local()
+
+    def get(self) -> "praw.Reddit":
+        if not hasattr(self._local, "reddit"):
+            import praw
+
+            self._local.reddit = praw.Reddit(
+                client_id=self.reddit_id,
+                client_secret=self.reddit_secret,
+                user_agent=f"python_script:subreddit_downloader:(by /u/{self.reddit_username})",
+                requestor_class=rate_limited_requestor_class(),
+                requestor_kwargs={"bucket": self.bucket},
+            )
+        return self._local.reddit
+
+
+def init_locals(debug: str,
+                output_dir: str,
+                subreddit: str,
+                run_args: dict,
+                export_formats=("csv",),
+                resume: Optional[str] = None,
+                raw_compression: str = "gzip",
+                xlsx: bool = True,
+                ) -> (dict, OutputManager):
+    """
+    Prepare the output directory and the run parameters.
+
+    When resuming, the time window and shard count stored by the interrupted run win over
+    the command line, so the shards (and their checkpoints) line up.
+    """
+    run_args.pop("reddit_secret")
+
+    if not debug:
+        logger.remove()
+        logger.add(sys.stderr, level="INFO")
+
+    output_manager = OutputManager(output_dir, subreddit, export_formats, run_id=resume,
+                                   raw_compression=raw_compression, xlsx=xlsx)
+
+    if resume:
+        previous_params = output_manager.load_params()
+        for key in ("utc_after", "utc_before", "laps"):
+            run_args[key] = previous_params[key]
+        output_manager.total_submissions_counter = previous_params.get("total_submissions_counter", 0)
+        output_manager.total_comments_counter = previous_params.get("total_comments_counter", 0)
+        output_manager.utc_older = previous_params.get("utc_older")
+        output_manager.utc_newer = previous_params.get("utc_newer")
+        logger.info(f"Resuming run {resume}")
+
+    output_manager.store_params(run_args)
+    return run_args, output_manager
+
+
+def init_clients(reddit_id: str,
+                 reddit_secret: str,
+                 reddit_username: str,
+                 requests_per_minute: int = 100
+                 ) -> ("PushshiftAPI", RedditClients):
+    from pushshift_py import PushshiftAPI
+
+    pushshift_api = PushshiftAPI()
+    reddit_clients = RedditClients(reddit_id, reddit_secret, reddit_username, requests_per_minute)
+    return pushshift_api, reddit_clients
+
+
+def utc_range_calculator(utc_received: int,
+                         utc_upper_bound: int,
+                         utc_lower_bound: int
+                         ) -> (int, int):
+    """
+    Calculate the max UTC range seen.
+
+    Increase/decrease utc_upper_bound/utc_lower_bound according with utc_received value
+    """
+    if not utc_upper_bound or not utc_lower_bound:
+        utc_upper_bound = utc_received
+        utc_lower_bound = utc_received
+
+    utc_lower_bound = utc_lower_bound if utc_received > utc_lower_bound else utc_received
+    utc_upper_bound = utc_upper_bound if utc_received < utc_upper_bound else utc_received
+
+    return utc_lower_bound, utc_upper_bound
+
+
+def comments_fetcher(sub, output_manager, reddit_api, expansion_budget: ExpansionBudget,
+                     collected_index: CollectedIndex = None):
+    """
+    Comments fetcher
+    Get the comments, expanding the MoreComments stubs best first within `expansion_budget`
+    (see datacollection/more_comments.py); the stubs left over are recorded as unexpanded
+
+    Comments already in `collected_index` are skipped; the comment tree is kept whole
+    as a CommentForest
+    """
+    from prawcore.exceptions import NotFound
+
+    try:
+        submission_rich_data = reddit_api.submission(id=sub.id)
+        logger.debug(f"Requesting {submission_rich_data.num_comments} comments...")
+        expansion = expand_comments(submission_rich_data, expansion_budget)
+    except NotFound:
+        logger.warning(f"Submission not found in PRAW: `{sub.id}` - `{sub.title}` - `{sub.full_link}`")
+        return
+    comments = expansion.comments
+    if expansion.unexpanded:
+        logger.debug(f"Submission `{sub.id}`: {len(expansion.unexpanded)} MoreComments left unexpanded after "
+                     f"{expansion.requests} requests in {expansion.seconds:.1f}s")
+    output_manager.unexpanded_list.extend(expansion.unexpanded)
+    output_manager.forests.append(CommentForest.build(sub.id, comments))
+    already_collected = set()
+    if collected_index is not None:
+        already_collected = collected_index.seen("reddit_comment", [c.id for c in comments])
+    for comment in comments:
+        if comment.id in already_collected:
+            continue
+        comment_useful_data = {
+            "id": comment.id,
+            "submission_id": sub.id,
+            "body": comment.body.replace('\n', '\\n'),
+            "created_utc": int(comment.created_utc),
+            "parent_id": comment.parent_id,
+            "permalink": comment.permalink,
+        }
+        output_manager.comments_raw_list.append(to_record(comment, COMMENT_FIELDS))
+        output_manager.comments_list.append(comment_useful_data)
+
+
+def submission_fetcher(sub, output_manager: OutputManager):
+    """
+    Get and store reddit submission info
+    """
+    # Sometimes the submission doesn't have the selftext
+    self_text_normalized = sub.selftext.replace('\n', '\\n') if hasattr(sub, "selftext") else "<not selftext available>"
+
+    submission_useful_data = {
+        "id": sub.id,
+        "created_utc": sub.created_utc,
+        "title": sub.title.replace('\n', '\\n'),
+        "selftext": self_text_normalized,
+        "full_link": sub.full_link,
+    }
+    output_manager.submissions_list.append(submission_useful_data)
+    output_manager.submissions_raw_list.append(to_record(sub.d_, SUBMISSION_FIELDS))
+
+
+def crawl_shard(shard, subreddit: str, pushshift_api: "PushshiftAPI", executor: ThreadPoolExecutor,
+                reddit_clients: RedditClients, output_manager: OutputManager,
+                batch_size: int, expansion_budget: ExpansionBudget, collected_index: CollectedIndex = None,
+                stop: threading.Event = None):
+    """
+    Crawl one `(utc_after, utc_before)` time shard from its newest submission backwards,
+    `batch_size` submissions at a time, checkpointing the cursor after every stored batch.
+
+    Returns early, between two batches, once `stop` is set.
+    """
+    checkpoint = output_manager.checkpoint
+    if checkpoint.is_done(shard):
+        logger.info(f"Shard {shard_key(shard)} already done, skipping")
+        return
+    cursor = checkpoint.cursor(shard)
+    # Submissions already stored from the cursor second: the next page starts at that second
+    # again, since more of them may not have fit in the last page
+    boundary = set(checkpoint.boundary(shard))
+
+    while stop is None or not stop.is_set():
+        with metrics.time("pushshift.search"):
+            submissions = list(pushshift_api.search_submissions(
+                subreddit=subreddit,
+                # `after` is exclusive, shards are [after, before)
+                after=shard[0] - 1,
+                before=cursor + 1 if boundary else cursor,
+                limit=batch_size
+            ))
+        new_submissions = [sub for sub in submissions if sub.id not in boundary]
+        if not new_submissions:
+            if len(submissions) < batch_size:
+                checkpoint.update(shard, cursor, done=True)
+                return
+            # A whole page from the cursor second: submissions of one second cannot be paged
+            # through, so move past it
+            logger.warning(f"Shard {shard_key(shard)}: {batch_size} or more submissions at {cursor}, "
+                           f"any beyond the first {batch_size} are skipped")
+            boundary = set()
+            continue
+
+        to_fetch = new_submissions
+        if collected_index is not None:
+            already_collected = collected_index.seen("reddit_submission", [s.id for s in new_submissions])
+            to_fetch = [sub for sub in new_submissions if sub.id not in already_collected]
+            logger.debug(f"Skipping {len(new_submissions) - len(to_fetch)} submissions collected by earlier runs")
+
+        start = time.perf_counter()
+        batch = SubmissionData()
+        # executor.map yields in submission order, so the output is the same as a serial run
+        for data in executor.map(lambda sub: fetch_submission(sub, reddit_clients, expansion_budget,
+                                                                collected_index),
+                                 to_fetch):
+            batch.merge(data)
+        elapsed = time.perf_counter() - start
+        logger.info(f"Shard {shard_key(shard)}: {len(batch.submissions_list)} submissions, "
+                    f"{len(batch.comments_list)} comments in {elapsed:.1f}s "
+                    f"({len(batch.submissions_list) / max(elapsed, 1e-9):.2f} submissions/s, "
+                    f"{len(batch.comments_list) / max(elapsed, 1e-9):.2f} comments/s)")
+
+        output_manager.store(batch)
+
+        # Only move the cursor once the batch is on disk
+        oldest = min(int(sub.created_utc) for sub in new_submissions)
+        if oldest != cursor:
+            boundary = set()
+        cursor = oldest
+        boundary.update(sub.id for sub in new_submissions if int(sub.created_utc) == cursor)
+        done = len(submissions) < batch_size
+        checkpoint.update(shard, cursor, done=done, boundary=sorted(boundary))
+        if done:
+            return
+
+
+def fetch_submission(sub, reddit_clients: RedditClients, expansion_budget: ExpansionBudget,
+                     collected_index: CollectedIndex = None) -> SubmissionData:
+    """
+    Worker: hydrate one submission and expand its comment forest on this thread's client
+    """
+    data = SubmissionData()
+    with metrics.time("reddit.submission"):
+        submission_fetcher(sub, data)
+        comments_fetcher(sub, data, reddit_clients.get(), expansion_budget, collected_index)
+    metrics.inc("submissions")
+    metrics.inc("comments", len(data.comments_list))
+    return data
+
+
+def join_shards(futures: list):
+    """
+    Wait for the running shards to notice the stop and return, so nothing is stored after
+    the outputs are closed; another Ctrl-C does not cut the wait short
+    """
+    while True:
+        try:
+            wait(futures)
+            return
+        except KeyboardInterrupt:
+            logger.warning("Waiting for the running shards to stop...")
+
+
+def collect(
+        subreddit: str,
+        output_dir: str = "./data",
+        batch_size: int = 1000,
+        laps: int = 3,
+        reddit_id: str = "",
+        reddit_secret: str = "",
+        reddit_username: str = "",
+        utc_after: Optional[int] = None,
+        utc_before: Optional[int] = None,
+        debug: Optional[bool] = False,
+        comments_cap: int = 100,
+        expand_seconds: float = 60.0,
+        expand_priority: str = "count",
+        skip_collected: bool = True,
+        parquet: bool = False,
+        workers: int = 8,
+        requests_per_minute: int = 100,
+        window_days: int = 30,
+        shard_workers: int = 3,
+        resume: Optional[str] = None,
+        raw_compression: str = "gzip",
+        xlsx: bool = True
+) -> OutputManager:
+    """
+    Crawl `subreddit` over `[utc_after, utc_before)` and store the submissions and comments
+    under `output_dir`; see RedditCollection.py for the meaning of every option
+    """
+    metrics.reset()
+    expansion_budget = ExpansionBudget(comments_cap, expand_seconds, expand_priority)
+    utc_before = utc_before or int(time.time())
+    utc_after = utc_after or utc_before - window_days * 24 * 3600
+
+    run_args, output_manager = init_locals(debug, output_dir, subreddit, {
+        "batch_size": batch_size,
+        "laps": laps,
+        "reddit_id": reddit_id,
+        "reddit_secret": reddit_secret,
+        "reddit_username": reddit_username,
+        "utc_after": utc_after,
+        "utc_before": utc_before,
+        "debug": debug,
+        "comments_cap": comments_cap,
+        "expand_seconds": expand_seconds,
+        "expand_priority": expand_priority,
+        "skip_collected": skip_collected,
+        "parquet": parquet,
+        "workers": workers,
+        "requests_per_minute": requests_per_minute,
+        "shard_workers": shard_workers,
+        "raw_compression": raw_compression,
+        "xlsx": xlsx
+    }, ("csv", "parquet") if parquet else ("csv",), resume, raw_compression, xlsx)
+    pushshift_api, reddit_clients = init_clients(reddit_id, reddit_secret, reddit_username, requests_per_minute)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    collected_index = output_manager.collected_index if skip_collected else None
+
+    timer = Timer(text="Elapsed time: {:.2f} seconds", logger=logger.debug)
+
+    shards = split_window(run_args["utc_after"], run_args["utc_before"], run_args["laps"])
+    logger.info(f"Crawling {len(shards)} time shards, {shard_workers} at a time")
+
+    stop = threading.Event()
+    shard_executor = ThreadPoolExecutor(max_workers=shard_workers)
+    futures = []
+    timer.start()
+    try:
+        futures = [shard_executor.submit(crawl_shard, shard, subreddit, pushshift_api, executor, reddit_clients,
+                                         output_manager, batch_size, expansion_budget, collected_index, stop)
+                   for shard in shards]
+        # Raise as soon as any shard fails instead of after the shards before it finish
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in done:
+            future.result()
+    except BaseException:
+        logger.error(f"Run interrupted, continue it with `--resume {output_manager.run_id}`")
+        stop.set()
+        shard_executor.shutdown(wait=False, cancel_futures=True)
+        executor.shutdown(wait=False, cancel_futures=True)
+        join_shards(futures)
+        output_manager.close()
+        raise
+    finally:
+        output_manager.enrich_and_store_params()
+        logger.info(metrics.finish(output_manager.runtime_dir))
+    timer.stop()
+
+    shard_executor.shutdown()
+    executor.shutdown()
+    output_manager.close()
+    logger.info(f'Reddit data exported to {output_manager.runtime_dir} '
+                f'({output_manager.total_submissions_counter} submissions, '
+                f'{output_manager.total_comments_counter} comments)')
+    return output_manager
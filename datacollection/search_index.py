@@ -0,0 +1,213 @@
+import csv
+import html
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from glob import glob
+from os.path import join
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from datacollection.export import CSV_FIELD_SIZE_LIMIT  # noqa: F401 (raises csv's field size limit)
+from datacollection.keywords import TAG_RE
+
+FTS_OPERATORS = {"AND", "OR", "NOT", "NEAR"}
+
+# Rows are inserted in transactions of this size, so an interrupted update keeps its progress
+BATCH_ROWS = 10_000
+
+
+def clean_text(text: str) -> str:
+    # YouTube comments are HTML and the Reddit tables store newlines as a literal `\\n`
+    return html.unescape(TAG_RE.sub(" ", (text or "").replace("\\n", "\n"))).strip()
+
+
+def parse_time(value) -> Optional[float]:
+    """
+    Unix seconds from a Reddit `created_utc` or an ISO 8601 YouTube timestamp or date (UTC
+    unless it says otherwise; None if empty)
+    """
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+class SearchIndex:
+    """
+    SQLite FTS5 index over everything the collectors exported: YouTube comments, comment
+    summaries, transcripts and transcript summaries, and Reddit submissions and comments.
+
+    Every document keeps its source table, scope (video URL or subreddit), link, title and
+    creation time (Unix seconds, where the export has one) in a plain table; the full-text
+    index stores only the tokens and points back to it by rowid. Exported tables are
+    append-only, so every update only reads the rows added since the last one.
+    """
+
+    def __init__(self, path: str = "search_index.sqlite"):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                scope TEXT,
+                url TEXT,
+                title TEXT,
+                created REAL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS documents_source_scope ON documents (source, scope);
+            CREATE INDEX IF NOT EXISTS documents_created ON documents (created);
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                title, text, content='documents', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT NOT NULL,
+                source TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                PRIMARY KEY (path, source)
+            );""")
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _insert(self, documents: List[tuple]):
+        for document in documents:
+            cursor = self._conn.execute("INSERT INTO documents (source, scope, url, title, created, text) "
+                                        "VALUES (?, ?, ?, ?, ?, ?)", document)
+            self._conn.execute("INSERT INTO documents_fts (rowid, title, text) VALUES (?, ?, ?)",
+                               (cursor.lastrowid, document[3], document[5]))
+
+    def add_csv(self, path: str, source: str, text_column: str, title_column: str = None,
+                scope_column: str = None, url_column: str = None, created_column: str = None,
+                scope: str = None, url_prefix: str = "") -> int:
+        """
+        Index the rows of an exported (append-only) CSV table that were not indexed yet as
+        `source` documents. `scope` is a fixed scope for every row (e.g. the subreddit).
+
+        Returns the number of documents added.
+        """
+        row = self._conn.execute("SELECT rows FROM sources WHERE path = ? AND source = ?",
+                                 (path, source)).fetchone()
+        start = row[0] if row is not None else 0
+        added = 0
+        batch = []
+
+        def flush(rows_read):
+            self._insert(batch)
+            self._conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (path, source, rows_read))
+            self._conn.commit()
+            batch.clear()
+
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            columns = {name: i for i, name in enumerate(header)}
+
+            def value(values, column):
+                i = columns.get(column)
+                return values[i] if column is not None and i is not None and i < len(values) else None
+
+            rows_read = 0
+            for rows_read, values in enumerate(reader, start=1):
+                if rows_read <= start:
+                    continue
+                text = clean_text(value(values, text_column))
+                title = clean_text(value(values, title_column)) or None
+                # Rows with nothing to search (e.g. a failed summary) are skipped; link posts keep their title
+                if not text and not (title and source == "reddit_submissions"):
+                    continue
+                link = value(values, url_column)
+                batch.append((source, value(values, scope_column) or scope,
+                              url_prefix + link if link and link.startswith("/") else link,
+                              title, parse_time(value(values, created_column)), text))
+                added += 1
+                if len(batch) >= BATCH_ROWS:
+                    flush(rows_read)
+            if rows_read > start:
+                flush(rows_read)
+        return added
+
+    def search(self, query: str, source: str = None, scope: str = None, since: float = None,
+               until: float = None, limit: int = 20) -> List[Dict]:
+        """
+        Documents matching an FTS5 `query` (words, "phrases", prefix*, AND/OR/NOT, NEAR),
+        best BM25 match first, with a highlighted snippet. Queries that are not valid FTS5
+        syntax are searched as plain words.
+        """
+        filters = []
+        parameters = []
+        for clause, argument in (("d.source = ?", source), ("d.scope = ?", scope),
+                                 ("d.created >= ?", since), ("d.created < ?", until)):
+            if argument is not None:
+                filters.append(clause)
+                parameters.append(argument)
+        sql = ("SELECT d.source, d.scope, d.url, d.title, d.created, "
+               "snippet(documents_fts, -1, '[', ']', ' ... ', 16), bm25(documents_fts) "
+               "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+               "WHERE documents_fts MATCH ?" + "".join(f" AND {clause}" for clause in filters) +
+               " ORDER BY bm25(documents_fts) LIMIT ?")
+        try:
+            rows = self._conn.execute(sql, [query, *parameters, limit]).fetchall()
+        except sqlite3.OperationalError:
+            # e.g. an unbalanced quote or a bare operator: search the words on their own instead
+            words = " ".join(f'"{word}"' for word in re.findall(r"\w+", query) if word not in FTS_OPERATORS)
+            rows = self._conn.execute(sql, [words, *parameters, limit]).fetchall() if words else []
+        return [{'source': row[0], 'scope': row[1], 'url': row[2], 'title': row[3], 'created': row[4],
+                 'snippet': row[5], 'score': -row[6]} for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._conn.execute("SELECT source, COUNT(*) FROM documents GROUP BY source"))
+
+    def optimize(self):
+        # Merge the FTS5 segments written by many small updates into one b-tree
+        self._conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def update_from_exports(index: SearchIndex, comment_dir: str = None, transcript_dir: str = None,
+                        reddit_dir: str = None) -> int:
+    """
+    Add the rows appended to the exported comment, transcript and Reddit tables since the
+    last update; a directory that is None is left out. Returns the number of new documents.
+    """
+    added = 0
+    if comment_dir is not None:
+        comments = join(comment_dir, "comments.csv")
+        if os.path.exists(comments):
+            added += index.add_csv(comments, "youtube_comments", "Comments", title_column="Title",
+                                   scope_column="URL", url_column="URL", created_column="Published")
+        summaries = join(comment_dir, "summaries.csv")
+        if os.path.exists(summaries):
+            added += index.add_csv(summaries, "youtube_comment_summaries", "Comment Summary", title_column="Title",
+                                   scope_column="URL", url_column="URL", created_column="Summarized At")
+    if transcript_dir is not None:
+        transcripts = join(transcript_dir, "transcripts.csv")
+        if os.path.exists(transcripts):
+            added += index.add_csv(transcripts, "youtube_transcripts", "Transcript", title_column="Title",
+                                   scope_column="URL", url_column="URL", created_column="Publish Date")
+            added += index.add_csv(transcripts, "youtube_transcript_summaries", "Transcript Summary",
+                                   title_column="Title", scope_column="URL", url_column="URL",
+                                   created_column="Publish Date")
+    if reddit_dir is not None:
+        # <reddit_dir>/<subreddit>/<run_id>/<table>.csv
+        for path in sorted(glob(join(reddit_dir, "*", "*", "submissions.csv"))):
+            added += index.add_csv(path, "reddit_submissions", "selftext", title_column="title",
+                                   url_column="full_link", created_column="created_utc",
+                                   scope=Path(path).parent.parent.name)
+        for path in sorted(glob(join(reddit_dir, "*", "*", "comments.csv"))):
+            added += index.add_csv(path, "reddit_comments", "body", url_column="permalink",
+                                   created_column="created_utc", scope=Path(path).parent.parent.name,
+                                   url_prefix="https://www.reddit.com")
+    return added
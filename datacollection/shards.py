@@ -0,0 +1,59 @@
+import os
+import threading
+from typing import List, Tuple
+
+import yaml
+
+
+def split_window(utc_after: int, utc_before: int, shards: int) -> List[Tuple[int, int]]:
+    """
+    Split `[utc_after, utc_before)` into `shards` contiguous, non-overlapping windows
+    """
+    shards = max(1, min(shards, utc_before - utc_after))
+    step = (utc_before - utc_after) / shards
+    bounds = [utc_after + round(i * step) for i in range(shards)] + [utc_before]
+    return [(bounds[i], bounds[i + 1]) for i in range(shards)]
+
+
+def shard_key(shard: Tuple[int, int]) -> str:
+    return f"{shard[0]}-{shard[1]}"
+
+
+class ShardCheckpoint:
+    """
+    Progress of every time shard, persisted after each finished batch so an interrupted
+    crawl resumes where it stopped.
+
+    Each shard records its `cursor` (the crawl walks from the newest submission backwards,
+    so everything after the cursor second is stored), the `boundary` ids of the submissions
+    already stored from the cursor second itself, and whether it is `done`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.shards = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.shards = yaml.load(f, yaml.FullLoader) or {}
+
+    def cursor(self, shard: Tuple[int, int]) -> int:
+        with self._lock:
+            return self.shards.get(shard_key(shard), {}).get("cursor", shard[1])
+
+    def boundary(self, shard: Tuple[int, int]) -> List[str]:
+        with self._lock:
+            return self.shards.get(shard_key(shard), {}).get("boundary", [])
+
+    def is_done(self, shard: Tuple[int, int]) -> bool:
+        with self._lock:
+            return self.shards.get(shard_key(shard), {}).get("done", False)
+
+    def update(self, shard: Tuple[int, int], cursor: int, done: bool = False, boundary: List[str] = ()):
+        with self._lock:
+            self.shards[shard_key(shard)] = {"cursor": cursor, "done": done, "boundary": list(boundary)}
+            # Write to a temporary file first so a crash never leaves a truncated checkpoint
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                yaml.dump(self.shards, f)
+            os.replace(tmp_path, self.path)
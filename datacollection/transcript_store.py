@@ -0,0 +1,167 @@
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Optional
+
+from datacollection.metrics import metrics
+
+# Videos without a transcript are asked again after this many seconds (captions may be added later)
+RETRY_UNAVAILABLE_AFTER = 7 * 24 * 3600
+
+
+class Transcript:
+    """
+    Timed transcript segments in array form: `starts` and `durations` in seconds and
+    `offsets` into `text`, the segments joined by single spaces (`offsets` has one extra
+    entry past the end). The full text is `text` itself, and a time range is two binary
+    searches and one string slice.
+    """
+
+    def __init__(self, starts: array, durations: array, offsets: array, text: str):
+        self.starts = starts
+        self.durations = durations
+        self.offsets = offsets
+        self.text = text
+
+    @classmethod
+    def from_segments(cls, segments: List[dict]) -> "Transcript":
+        """
+        Build from the `[{'text', 'start', 'duration'}, ...]` list returned by youtube_transcript_api
+        """
+        segments = [segment for segment in segments if 'text' in segment]
+        starts = array('d', (float(segment.get('start', 0.0)) for segment in segments))
+        durations = array('d', (float(segment.get('duration', 0.0)) for segment in segments))
+        offsets = array('q', [0])
+        for segment in segments:
+            offsets.append(offsets[-1] + len(segment['text']) + 1)
+        return cls(starts, durations, offsets, " ".join(segment['text'] for segment in segments))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def segment(self, i: int) -> dict:
+        return {'text': self.text[self.offsets[i]:self.offsets[i + 1] - 1],
+                'start': self.starts[i], 'duration': self.durations[i]}
+
+    def segments(self):
+        for i in range(len(self)):
+            yield self.segment(i)
+
+    def _range(self, start: float, end: float) -> (int, int):
+        # Segments overlapping [start, end): segments start in order, so everything from the
+        # first segment still running at `start` to the last one starting before `end`
+        first = bisect_left(self.starts, start)
+        while first > 0 and self.starts[first - 1] + self.durations[first - 1] > start:
+            first -= 1
+        return first, max(first, bisect_right(self.starts, end - 1e-9))
+
+    def text_between(self, start: float, end: float) -> str:
+        first, last = self._range(start, end)
+        if first == last:
+            return ""
+        return self.text[self.offsets[first]:self.offsets[last] - 1]
+
+    def slice(self, start: float, end: float) -> "Transcript":
+        first, last = self._range(start, end)
+        base = self.offsets[first]
+        return Transcript(self.starts[first:last], self.durations[first:last],
+                          array('q', (offset - base for offset in self.offsets[first:last + 1])),
+                          self.text[base:self.offsets[last] - 1] if last > first else "")
+
+
+class TranscriptStore:
+    """
+    SQLite store of downloaded transcripts, one row per video with the segment arrays
+    as binary blobs. Videos without a transcript are remembered too, so every video is
+    downloaded once (unavailable ones again after RETRY_UNAVAILABLE_AFTER).
+    """
+
+    def __init__(self, path: str = "transcripts.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcripts (
+                video_id TEXT PRIMARY KEY,
+                fetched REAL NOT NULL,
+                error TEXT,
+                starts BLOB,
+                durations BLOB,
+                offsets BLOB,
+                text TEXT
+            )""")
+        self._conn.commit()
+
+    def get(self, video_id: str) -> Optional[Transcript]:
+        with self._lock:
+            row = self._conn.execute("SELECT starts, durations, offsets, text FROM transcripts "
+                                     "WHERE video_id = ? AND error IS NULL", (video_id,)).fetchone()
+        if row is None:
+            return None
+        starts, durations, offsets = array('d'), array('d'), array('q')
+        starts.frombytes(row[0])
+        durations.frombytes(row[1])
+        offsets.frombytes(row[2])
+        return Transcript(starts, durations, offsets, row[3])
+
+    def needs_fetch(self, video_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT fetched, error FROM transcripts WHERE video_id = ?",
+                                     (video_id,)).fetchone()
+        if row is None:
+            return True
+        fetched, error = row
+        return error is not None and time.time() - fetched > RETRY_UNAVAILABLE_AFTER
+
+    def put(self, video_id: str, transcript: Transcript):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO transcripts VALUES (?, ?, NULL, ?, ?, ?, ?)",
+                               (video_id, time.time(), transcript.starts.tobytes(), transcript.durations.tobytes(),
+                                transcript.offsets.tobytes(), transcript.text))
+            self._conn.commit()
+
+    def put_unavailable(self, video_id: str, error: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, NULL, NULL, NULL, NULL)",
+                               (video_id, time.time(), error))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def download_transcript(video_id: str) -> Transcript:
+    from youtube_transcript_api import YouTubeTranscriptApi as yta
+
+    with metrics.time("youtube.transcript"):
+        return Transcript.from_segments(yta.get_transcript(video_id))
+
+
+def unavailable_errors() -> tuple:
+    # The video has no transcript to download; anything else (network errors, rate limiting) may succeed later
+    from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled, VideoUnavailable
+
+    return TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
+
+
+def fetch_transcript(video_id: str, store: TranscriptStore) -> Optional[Transcript]:
+    """
+    Return the stored transcript, downloading it first if this video was never fetched.
+
+    Returns None for videos without a transcript, which are stored as unavailable; other
+    download errors are raised and nothing is stored, so the next run tries again.
+    """
+    if not store.needs_fetch(video_id):
+        metrics.inc("transcript_store_hits")
+        return store.get(video_id)
+    try:
+        transcript = download_transcript(video_id)
+    except unavailable_errors() as e:
+        print(f"No transcript for video {video_id}: {type(e).__name__}")
+        metrics.inc("transcripts_unavailable")
+        store.put_unavailable(video_id, type(e).__name__)
+        return None
+    store.put(video_id, transcript)
+    return transcript
@@ -0,0 +1,251 @@
+import json
+import threading
+
+from datacollection.http_cache import CachingHttp, HttpCache
+from datacollection.metrics import metrics
+from datacollection.quota import DAILY_QUOTA, QuotaBudget, QuotaExceeded
+from datacollection.ratelimit import TokenBucket, call_with_retry
+
+# videos().list accepts at most 50 comma-separated ids per call
+VIDEOS_PER_REQUEST = 50
+# search().list returns at most 50 results per page
+SEARCH_PAGE_SIZE = 50
+
+# Quota units per call, see https://developers.google.com/youtube/v3/determine_quota_cost
+QUOTA_COSTS = {"youtube.search.list": 100}
+DEFAULT_QUOTA_COST = 1
+
+# Shared by the comment and transcript collectors, each under its own kind
+COLLECTED_INDEX_PATH = "collected_index.sqlite"
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# 403 is also used for errors that will never succeed (commentsDisabled, quotaExceeded)
+RETRYABLE_403_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+QUOTA_403_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+
+_local = threading.local()
+_clients = {}
+_clients_lock = threading.Lock()
+_http_cache = None
+_quota = None
+
+
+def build_client(api_key: str):
+    """
+    Build the YouTube service once per API key and share it; every call through `execute`
+    reuses the same discovery document and a keep-alive connection per thread
+    """
+    with _clients_lock:
+        if api_key not in _clients:
+            # googleapiclient takes a while to import, so only load it when a client is needed
+            from googleapiclient.discovery import build
+
+            _clients[api_key] = build('youtube', 'v3', developerKey=api_key)
+        return _clients[api_key]
+
+
+def configure_http_cache(path: str = "http_cache.sqlite", ttls: dict = None, offline: bool = False) -> HttpCache:
+    """
+    Answer the GET requests made through `execute` from an on-disk cache, revalidating
+    expired pages with their ETag. With `offline` only cached pages are served.
+    """
+    global _http_cache
+    close_http_cache()
+    _http_cache = HttpCache(path, ttls, offline)
+    return _http_cache
+
+
+def close_http_cache():
+    global _http_cache
+    if _http_cache is not None:
+        print(_http_cache.stats())
+        _http_cache.close()
+        _http_cache = None
+
+
+def configure_quota(path: str = "quota.sqlite", daily_limit: int = DAILY_QUOTA) -> QuotaBudget:
+    """
+    Count the units spent through `execute` against a persistent daily budget; calls that
+    do not fit in what is left today raise QuotaExceeded without reaching the API
+    """
+    global _quota
+    close_quota()
+    _quota = QuotaBudget(path, daily_limit)
+    return _quota
+
+
+def get_quota():
+    return _quota
+
+
+def close_quota():
+    global _quota
+    if _quota is not None:
+        print(f"YouTube quota: {_quota.used()} of {_quota.daily_limit} units used today")
+        _quota.close()
+        _quota = None
+
+
+def thread_http():
+    """
+    httplib2.Http objects are not thread-safe, so every worker thread gets its own,
+    wrapped in a CachingHttp when an HTTP cache is configured
+    """
+    if not hasattr(_local, "http") or _local.cache is not _http_cache:
+        import httplib2
+
+        http = httplib2.Http()
+        _local.http = CachingHttp(http, _http_cache) if _http_cache is not None else http
+        _local.cache = _http_cache
+    return _local.http
+
+
+def error_reason(error) -> str:
+    try:
+        return json.loads(error.content)["error"]["errors"][0]["reason"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return ""
+
+
+def is_retryable(error: Exception) -> bool:
+    from googleapiclient.errors import HttpError
+
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status == 403:
+        return error_reason(error) in RETRYABLE_403_REASONS
+    return status in RETRYABLE_STATUSES
+
+
+def is_quota_exceeded(error: Exception) -> bool:
+    from googleapiclient.errors import HttpError
+
+    return isinstance(error, HttpError) and error.resp.status == 403 and error_reason(error) in QUOTA_403_REASONS
+
+
+def execute(request, bucket: TokenBucket = None, max_retries: int = 5):
+    """
+    Execute a googleapiclient request on the calling thread's own connection,
+    rate limited by `bucket` and retried with backoff on 403/429/5xx.
+
+    Raises QuotaExceeded when the daily quota (or the configured budget) is used up.
+    """
+    method = getattr(request, "methodId", None) or "youtube.request"
+    cost = QUOTA_COSTS.get(method, DEFAULT_QUOTA_COST)
+    quota = _quota
+
+    def attempt():
+        if quota is not None:
+            quota.spend(cost)
+        metrics.inc("youtube_requests", method=method)
+        http = thread_http()
+        try:
+            with metrics.time(method):
+                return request.execute(http=http)
+        except Exception as e:
+            if is_quota_exceeded(e):
+                if quota is not None:
+                    quota.exhaust()
+                raise QuotaExceeded(f"YouTube quota exhausted ({method})") from e
+            raise
+        finally:
+            # Failed calls are charged against the quota too, pages served from the HTTP cache are not
+            if not getattr(http, "from_cache", False):
+                metrics.inc("youtube_quota_units", cost, method=method)
+            elif quota is not None:
+                quota.refund(cost)
+
+    return call_with_retry(attempt, is_retryable, bucket=bucket, max_retries=max_retries,
+                           on_retry=lambda e: metrics.inc("retries", api="youtube", method=method))
+
+
+def list_videos(youtube, video_ids, part: str = "snippet", bucket: TokenBucket = None) -> dict:
+    """
+    Resolve many video ids with one `videos().list` call per 50 ids.
+
+    Returns the API items keyed by video id; unknown or deleted videos are missing.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    items = {}
+    for start in range(0, len(video_ids), VIDEOS_PER_REQUEST):
+        batch = video_ids[start:start + VIDEOS_PER_REQUEST]
+        request = youtube.videos().list(part=part, id=",".join(batch))
+        response = execute(request, bucket)
+        for item in response.get('items', []):
+            items[item['id']] = item
+    return items
+
+
+def search_video_pages(youtube, keyword: str, max_results: int, bucket: TokenBucket = None):
+    """
+    Follow `search().list` pagination until `max_results` videos were returned,
+    yielding each page's videos as soon as the page arrives
+    """
+    for videos, _ in search_pages(youtube, keyword, max_results, bucket):
+        if videos:
+            yield videos
+
+
+def search_pages(youtube, keyword: str, max_results: int, bucket: TokenBucket = None, page_token: str = None):
+    """
+    Like `search_video_pages`, but yields `(videos, next_page_token)` for every page, the
+    token being None after the last one. Passing a token continues an earlier search.
+    """
+    remaining = int(max_results)
+    while remaining > 0:
+        request = youtube.search().list(
+            q=keyword,
+            part='id,snippet',
+            type='video',
+            maxResults=min(remaining, SEARCH_PAGE_SIZE),
+            pageToken=page_token
+        )
+        response = execute(request, bucket)
+
+        videos = []
+        for item in response.get('items', []):
+            if item['id']['kind'] == 'youtube#video':
+                video_data = {
+                    'title': item['snippet']['title'],
+                    'videoId': item['id']['videoId'],
+                    'description': item['snippet']['description'],
+                    'channelTitle': item['snippet']['channelTitle'],
+                    'publishedAt': item['snippet']['publishedAt']
+                }
+                videos.append(video_data)
+        videos = videos[:remaining]
+        remaining -= len(videos)
+        page_token = response.get('nextPageToken') if response.get('items') else None
+        yield videos, page_token
+        if not page_token:
+            return
+
+
+def search_videos(youtube, keyword: str, max_results: int, bucket: TokenBucket = None):
+    for page in search_video_pages(youtube, keyword, max_results, bucket):
+        yield from page
+
+
+def get_youtube_videos_by_keyword(api_key, keyword, max_results):
+    # Follows nextPageToken, so more than 50 results can be requested
+    youtube = build_client(api_key)
+    return list(search_videos(youtube, keyword, max_results))
+
+
+def remove_duplicates(video):
+    # Two search hits are the same video when their videoId matches, even if the snippets differ
+    seen = set()
+    for x in video:
+        if x['videoId'] not in seen:
+            seen.add(x['videoId'])
+            yield x
+
+
+def skip_collected(video, collected_index, kind: str):
+    # Drop videos already handled by an earlier run
+    for x in video:
+        if (kind, x['videoId']) in collected_index:
+            print(f"Already collected, skipping: {x['videoId']}")
+            continue
+        yield x
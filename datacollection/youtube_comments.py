@@ -0,0 +1,531 @@
+import csv
+import math
+import os
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from os.path import join
+from typing import Dict, List
+
+from datacollection import pipeline, youtube_api
+from datacollection.chunking import map_reduce
+from datacollection.collected_index import CollectedIndex
+from datacollection.dedupe import cluster_texts, collapse
+from datacollection.export import StreamingExporter
+from datacollection.keywords import tokenize
+from datacollection.llm import close as close_llm, get_llm, get_llm_cache
+from datacollection.llm_cache import cached_invoke
+from datacollection.metrics import metrics
+from datacollection.quota import QuotaBudget, QuotaExceeded, QuotaReservations
+from datacollection.ratelimit import TokenBucket
+from datacollection.youtube_api import COLLECTED_INDEX_PATH
+
+# You can update the prompt to whatever you want
+SUMMARY_PROMPT = """
+                summarize the following comments without losing any important points or opinions.
+                a comment starting with [N similar comments] was posted N times in near-identical form:
+                "{text}".
+                """
+MERGE_PROMPT = """
+                merge the following partial summaries of comments into one summary without losing any important points or opinions:
+                "{text}".
+                """
+
+# Large comment sections are summarized in chunks of about `CHUNK_TOKENS` tokens and the
+# partial summaries are merged afterwards
+CHUNK_TOKENS = 3000
+CHUNK_OVERLAP_TOKENS = 100
+# Videos summarized at the same time while comment fetching carries on; once
+# `MAX_PENDING_SUMMARIES` videos wait for their summary, the main loop waits too
+LLM_WORKERS = 4
+MAX_PENDING_SUMMARIES = 16
+
+# Videos whose comments were collected by an earlier run are skipped, or in incremental mode
+# revisited from the newest comment seen (their watermark) onwards
+COLLECTED_KIND = "youtube_comments"
+
+# Rows are appended to these tables as each video finishes; the summary is stored once per video.
+# Near-duplicate comments of a video share a Cluster number. Published is the comment's
+# `publishedAt`, Summarized At the start of the run that wrote the summary (both UTC).
+EXPORT_DIR = "Comment Archive"
+EXCEL_FILE = "Comment Archive.xlsx"
+EXPORT_TABLES = {
+    'comments': ['Title', 'URL', 'Comments', 'Cluster', 'Published'],
+    'summaries': ['Title', 'URL', 'Comment Summary', 'Summarized At'],
+}
+EXPORT_SHEETS = {'comments': 'Comments', 'summaries': 'Comment Summaries'}
+
+# Number of videos whose comments are fetched at the same time, all sharing one request budget
+FETCH_WORKERS = 8
+REQUESTS_PER_SECOND = 10
+
+# With a daily quota budget the sweep is planned one search page at a time: the page's videos
+# are ranked by one of these statistics and their comments fetched in that order, one unit
+# per page of COMMENTS_PER_PAGE threads
+PRIORITIES = {'comments': 'commentCount', 'views': 'viewCount'}
+COMMENTS_PER_PAGE = 100
+
+
+def get_video_details(youtube, video_id):
+    request = youtube.videos().list(part="snippet", id=video_id)
+    response = youtube_api.execute(request)
+    return response['items'][0]['snippet']
+
+
+def extract_keywords(text, num_keywords=12):
+    # Raw counts within one text; KeywordIndex ranks against the whole corpus with TF-IDF
+    words = tokenize(text)
+    most_common = Counter(words).most_common(num_keywords)
+    keywords = [word for word, _ in most_common]
+    return keywords
+
+
+def get_video_keywords(youtube, video_id):
+    details = get_video_details(youtube, video_id)
+    title = details['title']
+    description = details['description']
+    text = title + ' ' + description
+    keywords = extract_keywords(text)
+    return keywords
+
+
+def comment_threads(youtube, video_id, bucket: TokenBucket = None):
+    # Top-level comments, newest first; the next page is only requested once the caller gets there
+    request = youtube.commentThreads().list(
+        part="snippet",
+        videoId=video_id,
+        order="time",
+        maxResults=COMMENTS_PER_PAGE  # Set the maximum results per page
+    )
+    while request:
+        response = youtube_api.execute(request, bucket)
+        for item in response['items']:
+            yield item['snippet']['topLevelComment']
+        request = youtube.commentThreads().list_next(request, response)  # Use the nextPageToken for pagination
+
+
+def fetch_comments(youtube, video_id, bucket: TokenBucket = None):
+    return [comment['snippet']['textDisplay'] for comment in comment_threads(youtube, video_id, bucket)]
+
+
+def fetch_new_comments(youtube, video_id, bucket: TokenBucket = None, watermark: dict = None):
+    """
+    Comments posted after the `watermark` of an earlier run (all comments without one), as
+    `{'text', 'published'}` dicts, and the new watermark: the publish time of the newest comment and the `ids` of the
+    comments published in that second (None when the video has no comments).
+
+    Pages come newest first, so paging stops at the first comment older than the watermark.
+    `publishedAt` has a resolution of one second, so comments from the watermark second are
+    told apart by id. A watermark seeded from the export (`ExportedComments`) has no publish
+    time; its comments are told apart by their exported `texts`.
+    """
+    watermark = watermark or {}
+    published_after = watermark.get('published')
+    # Watermarks written before `ids` was kept only have the newest comment's id
+    seen_ids = set(watermark.get('ids') or [watermark.get('id')])
+    seen_texts = watermark.get('texts', ())
+    comments = []
+    top = None
+    top_ids = []
+    for comment in comment_threads(youtube, video_id, bucket):
+        published = comment['snippet']['publishedAt']
+        if published_after and published < published_after:
+            break
+        if top is None:
+            top = published
+        if published == top:
+            top_ids.append(comment['id'])
+        text = comment['snippet']['textDisplay']
+        if comment['id'] in seen_ids or text in seen_texts:
+            continue
+        comments.append({'text': text, 'published': published})
+    if top is None:
+        top, top_ids = published_after, []
+    if top is not None and top == published_after:
+        top_ids = sorted(seen_ids.union(top_ids) - {None})
+    return comments, {'published': top, 'ids': top_ids} if top is not None else None
+
+
+class ExportedComments:
+    """
+    Comment texts, cluster count and latest summary per video URL, read from the export of
+    earlier runs. Videos collected before watermarks were kept have none, so incremental
+    mode seeds one from here instead of exporting all their comments again.
+
+    The export is read once, on the first `watermark` call.
+    """
+
+    def __init__(self, export_dir: str):
+        self.export_dir = export_dir
+        self._videos = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, dict]:
+        videos = {}
+        comments_path = join(self.export_dir, "comments.csv")
+        if os.path.exists(comments_path):
+            with open(comments_path, "r", newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    video = videos.setdefault(row['URL'], {'texts': set(), 'clusters': 0, 'summary': None})
+                    video['texts'].add(row['Comments'])
+                    if row.get('Cluster'):
+                        video['clusters'] = max(video['clusters'], int(row['Cluster']) + 1)
+        summaries_path = join(self.export_dir, "summaries.csv")
+        if os.path.exists(summaries_path):
+            with open(summaries_path, "r", newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    # The last row per URL is the current summary
+                    videos.setdefault(row['URL'], {'texts': set(), 'clusters': 0, 'summary': None})['summary'] = \
+                        row['Comment Summary']
+        return videos
+
+    def watermark(self, video_id: str) -> dict:
+        with self._lock:
+            if self._videos is None:
+                self._videos = self._load()
+        video = self._videos.get("https://www.youtube.com/watch?v=" + video_id)
+        return dict(video) if video is not None else {'texts': set(), 'clusters': 0, 'summary': None}
+
+
+def fetch_comments_concurrently(youtube, executor, videos, bucket: TokenBucket = None,
+                                max_pending: int = 2 * FETCH_WORKERS, watermarks: CollectedIndex = None,
+                                exported: ExportedComments = None, on_done=None):
+    # Submit each video as soon as search yields it; the (video, watermark, future) triples come
+    # back in search order so the output stays deterministic. Without `watermarks` every
+    # comment is fetched; collected videos without a watermark get one from `exported`.
+    # `on_done(video)` is called when a video's fetch finishes, fails or is cancelled.
+    def submit(video):
+        watermark = watermarks.watermark(COLLECTED_KIND, video['videoId']) if watermarks is not None else None
+        if watermark is None and exported is not None and \
+                watermarks.seen(COLLECTED_KIND, [video['videoId']]):
+            watermark = exported.watermark(video['videoId'])
+        future = executor.submit(fetch_new_comments, youtube, video['videoId'], bucket, watermark)
+        if on_done is not None:
+            future.add_done_callback(lambda _: on_done(video))
+        return video, watermark, future
+
+    pending = (submit(video) for video in videos)
+    return pipeline.prefetch(pending, max_pending=max_pending)
+
+
+def plan_comment_sweep(youtube, videos, budget: QuotaBudget, priority: str = "comments",
+                       bucket: TokenBucket = None) -> List[dict]:
+    """
+    Rank `videos` by their comment or view count, highest first, and estimate what
+    fetching their comments costs against the quota left today.
+
+    Costs one `videos().list` unit per 50 videos. Every returned video carries its
+    estimated number of comment pages in `commentPages`.
+    """
+    videos = list(videos)
+    if not videos:
+        return []
+    items = youtube_api.list_videos(youtube, [video['videoId'] for video in videos], part="statistics",
+                                    bucket=bucket)
+    ranked = []
+    for video in videos:
+        statistics = items.get(video['videoId'], {}).get('statistics', {})
+        # commentCount includes replies, so this overestimates the top-level pages a little
+        pages = max(1, math.ceil(int(statistics.get('commentCount', 0)) / COMMENTS_PER_PAGE))
+        ranked.append(dict(video, commentPages=pages, priority=int(statistics.get(PRIORITIES[priority], 0))))
+    ranked.sort(key=lambda video: video['priority'], reverse=True)
+
+    remaining = budget.remaining()
+    cost = fits = 0
+    for video in ranked:
+        cost += video['commentPages']
+        if cost <= remaining:
+            fits += 1
+    print(f"Planned {len(ranked)} videos by {priority}: about {cost} quota units, {remaining} left today "
+          f"(about {fits} videos)")
+    return ranked
+
+
+class CommentSweep:
+    """
+    The quota-budgeted sweep of one keyword, planned one search page at a time so comment
+    fetching starts with the first page (see `plan_comment_sweep`).
+
+    Before a video is handed out, its estimated comment pages are reserved against the
+    quota left today, and a search page is only requested when its units fit as well.
+    The sweep stops at the first video or page that does not fit (`refused`), so no
+    units are spent on a video that could not be finished. A paused sweep is saved to
+    the budget with its search position and resumed by the next run with the keyword.
+    """
+
+    def __init__(self, youtube, keyword: str, num_videos: int, budget: QuotaBudget, priority: str = "comments",
+                 bucket: TokenBucket = None, dedupe: bool = True, collected_index: CollectedIndex = None):
+        self.youtube = youtube
+        self.keyword = keyword
+        self.budget = budget
+        self.priority = priority
+        self.bucket = bucket
+        self.dedupe = dedupe
+        # Collected videos are skipped when given, i.e. outside incremental mode
+        self.collected_index = collected_index
+        self.reservations = QuotaReservations(budget)
+        job = budget.load_job(COLLECTED_KIND, keyword)
+        if job is None:
+            self.resumed = []
+            self.search = {'pageToken': None, 'remaining': num_videos}
+        else:
+            # Jobs saved before searches were resumable have no search position and end with their videos
+            self.resumed = job
+            self.search = budget.load_search(COLLECTED_KIND, keyword)
+        # Every video planned so far, done or not
+        self.planned = list(self.resumed)
+        self.seen = {video['videoId'] for video in self.planned}
+        if job is not None:
+            print(f"Resuming the paused sweep for {keyword!r}: {self.left(set())} videos left")
+
+    @property
+    def refused(self) -> bool:
+        return self.reservations.refused
+
+    def videos(self):
+        # The paused videos first, then the rest of the search, page by page
+        pages = [self.resumed]
+        while True:
+            for video in pages.pop():
+                if not self.reservations.reserve(video['commentPages']):
+                    return
+                yield video
+            page = self._next_page()
+            if page is None:
+                return
+            pages.append(page)
+
+    def release(self, video: dict):
+        # Called once the video's comments are fetched (or the fetch failed)
+        self.reservations.release(video['commentPages'])
+
+    def _next_page(self):
+        if self.search is None or self.search['remaining'] <= 0:
+            return None
+        # The search page and the statistics of its videos
+        cost = youtube_api.QUOTA_COSTS["youtube.search.list"] + 1
+        if not self.reservations.reserve(cost):
+            return None
+        try:
+            videos, page_token = next(youtube_api.search_pages(self.youtube, self.keyword, self.search['remaining'],
+                                                               self.bucket, self.search['pageToken']))
+            remaining = self.search['remaining'] - len(videos)
+            self.search = {'pageToken': page_token, 'remaining': remaining} if page_token and remaining > 0 else None
+            if self.dedupe:
+                videos = list(youtube_api.remove_duplicates(
+                    video for video in videos if video['videoId'] not in self.seen))
+            if self.collected_index is not None:
+                videos = list(youtube_api.skip_collected(videos, self.collected_index, COLLECTED_KIND))
+            ranked = plan_comment_sweep(self.youtube, videos, self.budget, self.priority, self.bucket)
+        finally:
+            self.reservations.release(cost)
+        self.seen.update(video['videoId'] for video in ranked)
+        self.planned.extend(ranked)
+        return ranked
+
+    def left(self, done: set) -> int:
+        # Planned videos not done yet, plus the search results not requested yet
+        return sum(video['videoId'] not in done for video in self.planned) + \
+            (self.search['remaining'] if self.search is not None else 0)
+
+    def save(self, done: set) -> int:
+        # Keep what is left for the next run; returns the number of videos left
+        videos = [video for video in self.planned if video['videoId'] not in done]
+        self.budget.save_job(COLLECTED_KIND, self.keyword, videos, self.search)
+        return self.left(done)
+
+    def finish(self):
+        self.budget.finish_job(COLLECTED_KIND, self.keyword)
+
+
+def summarize_comments(comments, llm=None, cache=None):
+    with metrics.time("summarize_comments"):
+        return map_reduce(llm or get_llm(), cache or get_llm_cache(), SUMMARY_PROMPT, MERGE_PROMPT, comments,
+                          separator="\n", chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+
+
+def summarize_clusters(comments, previous: dict = None):
+    """
+    Collapse near-duplicate comments (spam, copy-pasted jokes) to one representative with
+    a count before summarizing. Returns the cluster id of every comment and the summary.
+
+    With the watermark of an earlier run (`previous`), `comments` are the new comments
+    only: their cluster ids continue after the earlier ones and their summary is merged
+    into the earlier summary.
+    """
+    with metrics.time("dedupe_comments"):
+        cluster_ids = cluster_texts(comments)
+        representatives = collapse(comments, cluster_ids)
+    metrics.inc("comments_collapsed", len(comments) - len(representatives))
+    summary = summarize_comments(representatives)
+    if previous is None:
+        return cluster_ids, summary
+    offset = previous.get('clusters', 0)
+    if previous.get('summary'):
+        with metrics.time("summarize_comments"):
+            summary = cached_invoke(get_llm(), get_llm_cache(), MERGE_PROMPT,
+                                    "\n\n".join([previous['summary'], summary]))
+    return [cluster_id + offset for cluster_id in cluster_ids], summary
+
+
+def collect_comments(keyword: str, num_videos: int, api_key: str = "", dedupe: bool = True,
+                     export_dir: str = EXPORT_DIR, excel_file: str = EXCEL_FILE, export_formats=("csv",),
+                     fetch_workers: int = FETCH_WORKERS, llm_workers: int = LLM_WORKERS, incremental: bool = False,
+                     priority: str = "comments", youtube=None) -> int:
+    """
+    Search `keyword`, fetch the comments of up to `num_videos` videos, summarize them and
+    export the rows as each video finishes.
+
+    Videos collected by an earlier run are skipped. With `incremental`, they are revisited
+    instead: only comments newer than the video's watermark are fetched and exported, and
+    only videos with new comments get a new (merged) summary row.
+
+    When a quota budget is configured (`youtube_api.configure_quota`), each search page is
+    ranked by `priority` and a video is only fetched when its estimated comment pages fit
+    into the quota left today (see `CommentSweep`). Once the quota is used up, fetching
+    stops, the videos already fetched are still written, and the rest of the plan and the
+    search wait for the next run with the same keyword. Returns the number of videos left
+    for that run (0 when the sweep is complete).
+
+    `youtube` is an already built service; by default one is built from `api_key`. The LLM
+    and its cache are created on first use and shut down at the end of the run.
+    """
+    metrics.reset()
+    started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    youtube = youtube or youtube_api.build_client(api_key)
+    bucket = TokenBucket(rate=REQUESTS_PER_SECOND)
+    collected_index = CollectedIndex(COLLECTED_INDEX_PATH)
+    budget = youtube_api.get_quota()
+
+    # Search pages are consumed as they arrive, comment fetching starts while search is still paging
+    sweep = None
+    if budget is not None:
+        # A paused sweep is resumed from its plan and search position
+        sweep = CommentSweep(youtube, keyword, num_videos, budget, priority, bucket, dedupe,
+                             collected_index=None if incremental else collected_index)
+        videos = sweep.videos()
+    else:
+        videos = youtube_api.search_videos(youtube, keyword, num_videos, bucket)
+        if dedupe:
+            videos = youtube_api.remove_duplicates(videos)
+        if not incremental:
+            videos = youtube_api.skip_collected(videos, collected_index, COLLECTED_KIND)
+
+    exporter = StreamingExporter(export_dir, EXPORT_TABLES, export_formats,
+                                 xlsx_path=excel_file, sheets=EXPORT_SHEETS)
+    # The tables accumulate across runs, the workbook is written from scratch: start it with the earlier rows
+    exporter.copy_csv_to_xlsx()
+    # Videos that need no more work when a paused sweep is resumed
+    done = set()
+
+    def write_video(video, comments, newest, cluster_ids, comment_summary):
+        video_url = "https://www.youtube.com/watch?v=" + video['videoId']
+        exporter.write('comments', [{
+            'Title': video['title'],
+            'URL': video_url,
+            'Comments': comment['text'],
+            'Cluster': cluster_id,
+            'Published': comment['published']
+        } for comment, cluster_id in zip(comments, cluster_ids)])
+        exporter.write('summaries', [{
+            'Title': video['title'],
+            'URL': video_url,
+            'Comment Summary': comment_summary,
+            'Summarized At': started
+        }])
+        # The rows are on disk, so the video does not need to be collected again, and an
+        # incremental run picks up after the newest comment
+        collected_index.add(COLLECTED_KIND, [video['videoId']])
+        done.add(video['videoId'])
+        clusters = max(cluster_ids) + 1 if cluster_ids else (newest or {}).get('clusters', 0)
+        collected_index.set_watermark(COLLECTED_KIND, video['videoId'],
+                                      dict(newest or {}, clusters=clusters, summary=comment_summary))
+        metrics.inc("videos", stage="comments")
+        metrics.inc("comments", len(comments))
+
+    def write_finished(pending, limit):
+        # Write videos in search order as their summaries complete; wait once more than `limit` are pending
+        while pending and (len(pending) > limit or pending[0][3].done()):
+            video, comments, newest, summary_future = pending.popleft()
+            try:
+                write_video(video, comments, newest, *summary_future.result())
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                metrics.inc("errors", stage="comments")
+
+    count = 1
+    executor = ThreadPoolExecutor(max_workers=fetch_workers)
+    summarizer = ThreadPoolExecutor(max_workers=llm_workers)
+    pending_summaries = deque()
+    paused = None
+    try:
+        try:
+            for video, watermark, comments_future in fetch_comments_concurrently(
+                    youtube, executor, videos, bucket, max_pending=2 * fetch_workers,
+                    watermarks=collected_index if incremental else None,
+                    exported=ExportedComments(export_dir) if incremental else None,
+                    on_done=sweep.release if sweep is not None else None):
+                try:
+                    video_url = "https://www.youtube.com/watch?v=" + video['videoId']
+                    print(video_url)
+                    print("Videos Processed: " + str(count))
+                    count += 1
+                    print("Videos Remaining: " + str(num_videos - count))
+                    comments, newest = comments_future.result()
+                    if watermark is not None and not comments:
+                        # Nothing new since the last run: keep the earlier rows and summary
+                        print("No new comments")
+                        metrics.inc("videos_unchanged", stage="comments")
+                        done.add(video['videoId'])
+                        if 'texts' in watermark and newest is not None:
+                            # Seeded from the export: keep a real watermark from now on
+                            collected_index.set_watermark(COLLECTED_KIND, video['videoId'],
+                                                          dict(newest, clusters=watermark['clusters'],
+                                                               summary=watermark['summary']))
+                    else:
+                        # Summarize in the background and move on to the next video
+                        pending_summaries.append((video, comments, newest,
+                                                  summarizer.submit(summarize_clusters,
+                                                                    [comment['text'] for comment in comments],
+                                                                    watermark)))
+
+                except QuotaExceeded:
+                    raise
+                except Exception as e:
+                    print(f"An error occurred: {e}")
+                    metrics.inc("errors", stage="comments")
+                    # e.g. comments disabled: retrying on a resumed sweep would not help
+                    done.add(video['videoId'])
+
+                write_finished(pending_summaries, MAX_PENDING_SUMMARIES)
+            if sweep is not None and sweep.refused:
+                paused = QuotaExceeded(f"Not enough YouTube quota left today to continue "
+                                       f"({budget.remaining()} units)")
+        except QuotaExceeded as e:
+            # Stop fetching; the videos already fetched are still summarized and written below
+            paused = e
+
+        write_finished(pending_summaries, 0)
+    finally:
+        # After a pause the queued fetches would only be refused
+        executor.shutdown(cancel_futures=paused is not None)
+        summarizer.shutdown()
+        close_llm()
+        collected_index.close()
+        exporter.close()
+
+    left = 0
+    if paused is not None:
+        if sweep is not None:
+            left = sweep.save(done)
+        else:
+            left = max(0, num_videos - len(done))
+        print(f"{paused}: paused with {left} videos left, run again after the quota resets to continue")
+    elif sweep is not None:
+        sweep.finish()
+
+    print(f'Video information exported to {export_dir} and {excel_file}')
+
+    print(metrics.finish(export_dir))
+    return left
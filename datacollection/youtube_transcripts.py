@@ -0,0 +1,212 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from datacollection import pipeline, youtube_api
+from datacollection.chunking import map_reduce
+from datacollection.collected_index import CollectedIndex
+from datacollection.export import StreamingExporter
+from datacollection.llm import close as close_llm, get_llm, get_llm_cache
+from datacollection.metrics import metrics
+from datacollection.quota import QuotaExceeded
+from datacollection.transcript_store import TranscriptStore, download_transcript, fetch_transcript
+from datacollection.youtube_api import COLLECTED_INDEX_PATH
+
+# You can update the prompts to whatever you want
+ORGANIZE_PROMPT = """
+                rearrange the following text into a paragraph without losing any words:
+                "{text}". 
+                """
+SUMMARY_PROMPT = """
+                summarize the following text without losing any important points:
+                "{text}". 
+                """
+MERGE_PROMPT = """
+                merge the following partial summaries into one summary without losing any important points:
+                "{text}". 
+                """
+
+# Long transcripts are processed in chunks of about `CHUNK_TOKENS` tokens. Organized chunks
+# are joined back together, chunk summaries are merged.
+CHUNK_TOKENS = 3000
+CHUNK_OVERLAP_TOKENS = 100
+# Videos processed by the LLM at the same time while metadata lookups carry on; once
+# `MAX_PENDING_VIDEOS` videos wait for the LLM, the main loop waits too
+LLM_WORKERS = 4
+MAX_PENDING_VIDEOS = 16
+
+# Transcripts are downloaded `TRANSCRIPT_WORKERS` at a time into a local store with their
+# segment timings, so every video is downloaded once
+TRANSCRIPT_STORE_PATH = "transcripts.sqlite"
+TRANSCRIPT_WORKERS = 8
+
+# Videos whose transcripts were collected by an earlier run are skipped
+COLLECTED_KIND = "youtube_transcript"
+
+# Rows are appended to disk as each video finishes
+EXPORT_DIR = "Transcript Record"
+EXCEL_FILE = "Transcript Record.xlsx"
+EXPORT_TABLES = {
+    'transcripts': ['Title', 'Description', 'Publish Date', 'View Count', 'URL', 'Transcript', 'Transcript Summary'],
+}
+EXPORT_SHEETS = {'transcripts': 'Transcripts'}
+
+
+def get_video_details(youtube, video_ids):
+    # One videos().list call per 50 ids instead of one client and one call per video
+    items = youtube_api.list_videos(youtube, video_ids, part="snippet,statistics")
+    details = {}
+    for video_id, item in items.items():
+        details[video_id] = {
+            'Title': item['snippet']['title'],
+            'Description': item['snippet']['description'],
+            'Publish Date': item['snippet']['publishedAt'],
+            'View Count': item['statistics'].get('viewCount'),
+            'URL': f"https://www.youtube.com/watch?v={video_id}"
+        }
+    return details
+
+
+def videos_with_details(youtube, videos):
+    # Resolve metadata for up to 50 videos at a time while search keeps paging
+    videos = iter(videos)
+    while True:
+        batch = list(islice(videos, youtube_api.VIDEOS_PER_REQUEST))
+        if not batch:
+            return
+        details = get_video_details(youtube, [video['videoId'] for video in batch])
+        for video in batch:
+            yield video, details.get(video['videoId'])
+
+
+def get_transcript(video_id, store: TranscriptStore = None):
+    # Plain transcript text; with a store the download happens at most once per video
+    try:
+        if store is not None:
+            transcript = fetch_transcript(video_id, store)
+            return transcript.text if transcript is not None else ""
+        return download_transcript(video_id).text
+    except Exception as e:
+        print(f"Error getting transcript for video {video_id}: {e}")
+        metrics.inc("errors", stage="transcript")
+        return ""
+
+
+def fetch_transcripts_concurrently(executor, videos, store: TranscriptStore, max_pending: int = 2 * TRANSCRIPT_WORKERS):
+    # Start each download as soon as the video's metadata is known; the (video, details, future)
+    # triples come back in search order (the future is None for videos without details)
+    pending = ((video, details,
+                executor.submit(fetch_transcript, video['videoId'], store) if details is not None else None)
+               for video, details in videos)
+    return pipeline.prefetch(pending, max_pending=max_pending)
+
+
+def organize_transcript(video_id, llm=None, cache=None, transcript_text=None):
+    # Get the transcript text unless the caller already has it
+    info = get_transcript(video_id) if transcript_text is None else transcript_text
+    # No overlap here: repeated words would end up twice in the organized text
+    with metrics.time("organize_transcript"):
+        return map_reduce(llm or get_llm(), cache or get_llm_cache(), ORGANIZE_PROMPT, None, info.split(),
+                          separator=" ", chunk_tokens=CHUNK_TOKENS, overlap_tokens=0)
+
+
+def summarize_transcript(video_id, organized_transcript=None, llm=None, cache=None):
+    # Reuse the organized transcript when the caller already has it
+    if organized_transcript is None:
+        organized_transcript = organize_transcript(video_id, llm, cache)
+    with metrics.time("summarize_transcript"):
+        return map_reduce(llm or get_llm(), cache or get_llm_cache(), SUMMARY_PROMPT, MERGE_PROMPT,
+                          organized_transcript.split(), separator=" ", chunk_tokens=CHUNK_TOKENS,
+                          overlap_tokens=CHUNK_OVERLAP_TOKENS)
+
+
+def process_transcript(video_id, video_details, transcript_text=None):
+    # Add the organized transcript and its summary to the video details
+    video_details['Transcript'] = organize_transcript(video_id, transcript_text=transcript_text)
+    video_details['Transcript Summary'] = summarize_transcript(video_id, video_details['Transcript'])
+    return video_details
+
+
+def collect_transcripts(keyword: str, num_videos: int, api_key: str = "", dedupe: bool = True,
+                        export_dir: str = EXPORT_DIR, excel_file: str = EXCEL_FILE, export_formats=("csv",),
+                        llm_workers: int = LLM_WORKERS, transcript_workers: int = TRANSCRIPT_WORKERS,
+                        youtube=None):
+    """
+    Search `keyword`, then organize and summarize the transcripts of up to `num_videos`
+    videos, exporting one row per video as it finishes.
+
+    `youtube` is an already built service; by default one is built from `api_key`. The LLM
+    and its cache are created on first use and shut down at the end of the run.
+    """
+    metrics.reset()
+    youtube = youtube or youtube_api.build_client(api_key)
+    collected_index = CollectedIndex(COLLECTED_INDEX_PATH)
+    transcript_store = TranscriptStore(TRANSCRIPT_STORE_PATH)
+
+    # Search, metadata lookups and transcript downloads run in the background while transcripts are processed
+    videos = youtube_api.search_videos(youtube, keyword, num_videos)
+    if dedupe:
+        videos = youtube_api.remove_duplicates(videos)
+    videos = youtube_api.skip_collected(videos, collected_index, COLLECTED_KIND)
+
+    exporter = StreamingExporter(export_dir, EXPORT_TABLES, export_formats,
+                                 xlsx_path=excel_file, sheets=EXPORT_SHEETS)
+    # The tables accumulate across runs, the workbook is written from scratch: start it with the earlier rows
+    exporter.copy_csv_to_xlsx()
+
+    def write_finished(pending, limit):
+        # Write videos in search order as they complete; wait once more than `limit` are pending
+        while pending and (len(pending) > limit or pending[0][1].done()):
+            video, future = pending.popleft()
+            try:
+                exporter.write('transcripts', [future.result()])
+            except Exception as e:
+                print(f"An error occurred for video {video['videoId']}: {e}")
+                metrics.inc("errors", stage="transcripts")
+                continue
+            # The row is on disk, so the video does not need to be collected again
+            collected_index.add(COLLECTED_KIND, [video['videoId']])
+            metrics.inc("videos", stage="transcripts")
+
+    count = 1
+    downloader = ThreadPoolExecutor(max_workers=transcript_workers)
+    summarizer = ThreadPoolExecutor(max_workers=llm_workers)
+    pending_videos = deque()
+    try:
+        try:
+            for video, video_details, transcript_future in fetch_transcripts_concurrently(
+                    downloader, pipeline.prefetch(videos_with_details(youtube, videos)), transcript_store,
+                    max_pending=2 * transcript_workers):
+                print(video['videoId'])
+                print("Videos Processed: " + str(count))
+                count += 1
+                print("Videos Remaining: " + str(num_videos - count))
+                if video_details is None:
+                    print(f"No details found for video {video['videoId']}, skipping")
+                    continue
+                try:
+                    transcript = transcript_future.result()
+                except Exception as e:
+                    # Not exported nor marked collected, so the next run tries this video again
+                    print(f"Error getting transcript for video {video['videoId']}: {e}")
+                    metrics.inc("errors", stage="transcript")
+                    continue
+                pending_videos.append((video, summarizer.submit(process_transcript, video['videoId'], video_details,
+                                                                transcript.text if transcript is not None else "")))
+                write_finished(pending_videos, MAX_PENDING_VIDEOS)
+        except QuotaExceeded as e:
+            # Search and metadata need quota, transcripts do not: finish the videos already found
+            print(f"{e}: stopping the search, run again after the quota resets to continue")
+
+        write_finished(pending_videos, 0)
+    finally:
+        downloader.shutdown()
+        summarizer.shutdown()
+        transcript_store.close()
+        close_llm()
+        collected_index.close()
+        exporter.close()
+
+    print(f'Video details exported to {export_dir} and {excel_file}')
+
+    print(metrics.finish(export_dir))
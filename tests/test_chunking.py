@@ -0,0 +1,76 @@
+from datacollection.chunking import CHARS_PER_TOKEN, chunk_items, estimate_tokens, map_reduce
+from datacollection.llm_cache import LLMCache
+
+
+class EchoLLM:
+    # Answers every prompt with its input, tagged with the prompt it came from
+    model = "echo"
+    base_url = "http://localhost"
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        kind, text = prompt.split(":", 1)
+        return f"{kind}({len(text)})"
+
+
+def words(count, size=3):
+    # Items of `size` tokens each
+    return [f"w{i:0{size * CHARS_PER_TOKEN - 2}d}" for i in range(count)]
+
+
+def test_chunks_stay_within_the_budget_and_keep_every_item():
+    items = words(20)
+    chunks = chunk_items(items, max_tokens=10)
+    assert all(sum(estimate_tokens(item) for item in chunk) <= 10 for chunk in chunks)
+    assert [item for chunk in chunks for item in chunk] == items
+
+
+def test_overlap_repeats_the_end_of_the_previous_chunk():
+    items = words(20)
+    chunks = chunk_items(items, max_tokens=12, overlap_tokens=3)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk[0] == previous[-1]
+    assert all(sum(estimate_tokens(item) for item in chunk) <= 12 for chunk in chunks)
+
+
+def test_oversized_items_are_split_on_words():
+    item = " ".join(words(10))
+    chunks = chunk_items([item], max_tokens=7)
+    assert len(chunks) > 1
+    assert " ".join(piece for chunk in chunks for piece in chunk) == item
+
+
+def test_small_inputs_are_one_prompt(tmp_path):
+    llm = EchoLLM()
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+    assert map_reduce(llm, cache, "map:{text}", "reduce:{text}", ["a", "b"]) == "map(3)"
+    assert llm.prompts == ["map:a\nb"]
+    cache.close()
+
+
+def test_large_inputs_are_mapped_then_merged(tmp_path):
+    llm = EchoLLM()
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+    result = map_reduce(llm, cache, "map:{text}", "reduce:{text}", words(40), chunk_tokens=20, overlap_tokens=0)
+    maps = [prompt for prompt in llm.prompts if prompt.startswith("map:")]
+    assert len(maps) == len(chunk_items(words(40), 20)) == 7
+    assert result.startswith("reduce(")
+    assert llm.prompts[-1].startswith("reduce:")
+
+    # A second run is answered from the cache
+    calls = len(llm.prompts)
+    assert map_reduce(llm, cache, "map:{text}", "reduce:{text}", words(40), chunk_tokens=20,
+                      overlap_tokens=0) == result
+    assert len(llm.prompts) == calls
+    cache.close()
+
+
+def test_without_reduce_template_the_partials_are_concatenated(tmp_path):
+    llm = EchoLLM()
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+    result = map_reduce(llm, cache, "map:{text}", None, words(10), chunk_tokens=9, overlap_tokens=0)
+    assert result.split("\n") == ["map(35)"] * 3 + ["map(11)"]
+    cache.close()
@@ -0,0 +1,27 @@
+from datacollection.dedupe import cluster_texts, collapse
+
+
+def test_near_duplicates_share_a_cluster():
+    texts = [
+        "These robots will take every waiter job in the country",
+        "Great video, thanks!",
+        "these robots will take every <b>waiter</b> job in the country!!",
+        "These robots will take every waiter job in the whole country",
+        "I would never eat at a restaurant like that",
+    ]
+    assert cluster_texts(texts) == [0, 1, 0, 0, 2]
+
+
+def test_cluster_ids_follow_first_appearance():
+    assert cluster_texts([]) == []
+    assert cluster_texts(["b b b", "a a a", "b b b"]) == [0, 1, 0]
+
+
+def test_texts_without_words_only_match_identical_texts():
+    texts = ["🤖🤖", "😂😂😂", "🤖🤖", "!!!", "  😂😂😂 "]
+    assert cluster_texts(texts) == [0, 1, 0, 2, 1]
+
+
+def test_collapse_keeps_the_first_text_with_the_cluster_size():
+    texts = ["first", "other", "first!"]
+    assert collapse(texts, cluster_texts(texts)) == ["[2 similar comments] first", "other"]
@@ -0,0 +1,100 @@
+import sqlite3
+import threading
+
+import pytest
+
+from datacollection.quota import QuotaBudget, QuotaExceeded, QuotaReservations
+
+
+@pytest.fixture
+def budget(tmp_path):
+    budget = QuotaBudget(str(tmp_path / "quota.sqlite"), daily_limit=100)
+    yield budget
+    budget.close()
+
+
+def test_spend_and_refund(budget):
+    budget.spend(60)
+    assert budget.used() == 60
+    assert budget.remaining() == 40
+    with pytest.raises(QuotaExceeded):
+        budget.spend(41)
+    # A refused call takes nothing
+    assert budget.used() == 60
+    budget.spend(40)
+    assert budget.remaining() == 0
+    budget.refund(30)
+    assert budget.used() == 70
+    budget.refund(500)
+    assert budget.used() == 0
+
+
+def test_usage_is_shared_between_runs(budget):
+    budget.spend(25)
+    other = QuotaBudget(budget.path, daily_limit=100)
+    assert other.used() == 25
+    other.exhaust()
+    other.close()
+    assert budget.remaining() == 0
+
+
+def test_save_load_and_finish_a_job(budget):
+    assert budget.load_job("youtube_comments", "robots") is None
+    videos = [{'videoId': "a", 'commentPages': 2}, {'videoId': "b", 'commentPages': 1}]
+    search = {'pageToken': "CDIQAA", 'remaining': 50}
+    budget.save_job("youtube_comments", "robots", videos, search)
+    assert budget.load_job("youtube_comments", "robots") == videos
+    assert budget.load_search("youtube_comments", "robots") == search
+    assert budget.load_job("youtube_comments", "waiters") is None
+
+    # Saving again replaces the job; a finished search is None
+    budget.save_job("youtube_comments", "robots", videos[1:])
+    assert budget.load_job("youtube_comments", "robots") == videos[1:]
+    assert budget.load_search("youtube_comments", "robots") is None
+
+    budget.finish_job("youtube_comments", "robots")
+    assert budget.load_job("youtube_comments", "robots") is None
+
+
+def test_jobs_saved_without_a_search_column_still_load(tmp_path):
+    path = str(tmp_path / "quota.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jobs (kind TEXT NOT NULL, name TEXT NOT NULL, videos TEXT NOT NULL, "
+                 "updated_at REAL NOT NULL, PRIMARY KEY (kind, name))")
+    conn.execute("INSERT INTO jobs VALUES ('youtube_comments', 'robots', '[{\"videoId\": \"a\"}]', 0)")
+    conn.commit()
+    conn.close()
+
+    budget = QuotaBudget(path)
+    assert budget.load_job("youtube_comments", "robots") == [{'videoId': "a"}]
+    assert budget.load_search("youtube_comments", "robots") is None
+    budget.close()
+
+
+def test_reservations_only_start_work_that_fits(budget):
+    budget.spend(90)
+    reservations = QuotaReservations(budget)
+    assert reservations.reserve(6)
+    assert reservations.reserve(4)
+    assert not reservations.refused
+
+    # An 11th unit waits for the running work instead of being refused
+    reserved = threading.Event()
+
+    def reserve():
+        if reservations.reserve(1):
+            reserved.set()
+
+    waiter = threading.Thread(target=reserve)
+    waiter.start()
+    assert not reserved.wait(0.1)
+    budget.refund(5)
+    reservations.release(6)
+    assert reserved.wait(5)
+    waiter.join()
+
+    # Work that does not fit even with nothing else running is refused
+    reservations.release(4)
+    reservations.release(1)
+    assert not reservations.reserve(16)
+    assert reservations.refused
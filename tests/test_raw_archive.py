@@ -0,0 +1,24 @@
+import pytest
+
+from datacollection.raw_archive import COMMENT_FIELDS, RawArchiveReader, RawArchiveWriter
+
+# Line breaks to str.splitlines() but not to "\n"-delimited JSON lines
+UNICODE_BREAKS = ["\u2028", "\u2029", "\u0085", "\x1c", "\x0b"]
+
+
+@pytest.mark.parametrize("compression", ["gzip", "none"])
+def test_round_trip_with_unicode_line_breaks(tmp_path, compression):
+    comments = [{"id": f"c{i}", "body": f"before{UNICODE_BREAKS[i % len(UNICODE_BREAKS)]}after {i}",
+                 "score": i} for i in range(20)]
+    writer = RawArchiveWriter(str(tmp_path / "comments"), COMMENT_FIELDS, compression, block_records=8)
+    for comment in comments:
+        writer.write(comment)
+    writer.close()
+
+    reader = RawArchiveReader(writer.path)
+    assert len(reader) == len(comments)
+    for comment in comments:
+        record = reader.get(comment["id"])
+        assert record["body"] == comment["body"]
+        assert record["score"] == comment["score"]
+    assert [record["id"] for record in reader] == [comment["id"] for comment in comments]
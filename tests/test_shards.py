@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("yaml")
+pytest.importorskip("codetiming")
+pytest.importorskip("loguru")
+
+from datacollection import reddit  # noqa: E402
+from datacollection.shards import ShardCheckpoint  # noqa: E402
+
+SHARD = (0, 200)
+
+
+def submissions(busiest=6):
+    # A page of 10 ends inside second 99, and the next one starts in it again
+    return [SimpleNamespace(id=f"a{i}", created_utc=100) for i in range(busiest)] + \
+        [SimpleNamespace(id=f"b{i}", created_utc=99) for i in range(8)] + \
+        [SimpleNamespace(id=f"c{i}", created_utc=50) for i in range(5)]
+
+
+class FakePushshift:
+    def __init__(self, submissions):
+        self.submissions = submissions
+
+    def search_submissions(self, subreddit, after, before, limit):
+        # Newest first, `after` and `before` exclusive
+        matching = [sub for sub in self.submissions if after < sub.created_utc < before]
+        return sorted(matching, key=lambda sub: -sub.created_utc)[:limit]
+
+
+class FakeOutput:
+    def __init__(self, checkpoint_path, fail_after=None):
+        self.checkpoint = ShardCheckpoint(checkpoint_path)
+        self.stored = []
+        self.fail_after = fail_after
+
+    def store(self, batch):
+        if self.fail_after is not None and len(self.stored) >= self.fail_after:
+            raise KeyboardInterrupt
+        self.stored.extend(batch.submissions_list)
+
+
+@pytest.fixture(autouse=True)
+def fetch_ids(monkeypatch):
+    # Only the submission id is stored; no Reddit client is needed
+    def fetch_submission(sub, *_):
+        data = reddit.SubmissionData()
+        data.submissions_list.append(sub.id)
+        return data
+
+    monkeypatch.setattr(reddit, "fetch_submission", fetch_submission)
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def crawl(output, executor, batch_size, stop=None, busiest=6):
+    reddit.crawl_shard(SHARD, "robots", FakePushshift(submissions(busiest)), executor, None, output, batch_size,
+                       None, stop=stop)
+
+
+@pytest.mark.parametrize("batch_size", [9, 10, 11, 30])
+def test_page_boundary_inside_a_second(tmp_path, executor, batch_size):
+    output = FakeOutput(str(tmp_path / "checkpoint.yaml"))
+    crawl(output, executor, batch_size)
+    assert sorted(output.stored) == sorted(sub.id for sub in submissions())
+    assert len(output.stored) == len(set(output.stored))
+    assert output.checkpoint.is_done(SHARD)
+
+
+def test_second_with_more_than_a_page_is_skipped_past(tmp_path, executor):
+    # Pushshift cannot page inside one second: the rest of it is lost, but the crawl goes on
+    output = FakeOutput(str(tmp_path / "checkpoint.yaml"))
+    crawl(output, executor, 10, busiest=25)
+    assert sorted(output.stored) == sorted([f"a{i}" for i in range(10)] + [f"b{i}" for i in range(8)] +
+                                           [f"c{i}" for i in range(5)])
+    assert output.checkpoint.is_done(SHARD)
+
+
+def test_resumes_from_the_checkpoint(tmp_path, executor):
+    path = str(tmp_path / "checkpoint.yaml")
+    interrupted = FakeOutput(path, fail_after=10)
+    with pytest.raises(KeyboardInterrupt):
+        crawl(interrupted, executor, 10)
+    assert len(interrupted.stored) == 10
+    assert not interrupted.checkpoint.is_done(SHARD)
+
+    # The first page ended inside second 99
+    resumed = FakeOutput(path)
+    assert resumed.checkpoint.cursor(SHARD) == 99
+    assert resumed.checkpoint.boundary(SHARD) == [f"b{i}" for i in range(4)]
+    crawl(resumed, executor, 10)
+    assert sorted(interrupted.stored + resumed.stored) == sorted(sub.id for sub in submissions())
+    assert resumed.checkpoint.is_done(SHARD)
+
+    # A finished shard is skipped
+    again = FakeOutput(path)
+    crawl(again, executor, 10)
+    assert again.stored == []
+
+
+def test_stops_between_batches(tmp_path, executor):
+    stop = threading.Event()
+    stop.set()
+    output = FakeOutput(str(tmp_path / "checkpoint.yaml"))
+    crawl(output, executor, 10, stop)
+    assert output.stored == []
+    assert not output.checkpoint.is_done(SHARD)
@@ -0,0 +1,149 @@
+import csv
+
+import pytest
+
+from datacollection import youtube_api
+from datacollection.youtube_comments import ExportedComments, fetch_new_comments
+
+VIDEO_ID = "vid00000000"
+
+
+class FakeRequest:
+    def __init__(self, page):
+        self.methodId = "youtube.commentThreads.list"
+        self.page = page
+
+    def execute(self, http=None):
+        return self.page
+
+
+class FakeYouTube:
+    """
+    commentThreads of one video, newest first, `page_size` per page
+    """
+
+    def __init__(self, comments, page_size=2):
+        self.comments = comments
+        self.page_size = page_size
+        self.requests = 0
+
+    def _page(self, start):
+        self.requests += 1
+        items = [{'snippet': {'topLevelComment': {'id': comment_id, 'snippet': {
+            'publishedAt': published, 'textDisplay': text}}}}
+            for comment_id, published, text in self.comments[start:start + self.page_size]]
+        page = {'items': items}
+        if start + self.page_size < len(self.comments):
+            page['nextPageToken'] = start + self.page_size
+        return FakeRequest(page)
+
+    def commentThreads(self):
+        youtube = self
+
+        class Resource:
+            def list(self, **_):
+                return youtube._page(0)
+
+            def list_next(self, request, response):
+                token = response.get('nextPageToken')
+                return youtube._page(token) if token is not None else None
+
+        return Resource()
+
+
+@pytest.fixture(autouse=True)
+def no_http(monkeypatch):
+    # The fake requests never use the connection
+    monkeypatch.setattr(youtube_api, "thread_http", lambda: None)
+
+
+def texts(comments):
+    return [comment['text'] for comment in comments]
+
+
+def test_first_fetch_returns_everything_and_the_newest_second():
+    youtube = FakeYouTube([
+        ("c4", "2024-02-01T00:00:10Z", "four"),
+        ("c3", "2024-02-01T00:00:10Z", "three"),
+        ("c2", "2024-02-01T00:00:09Z", "two"),
+        ("c1", "2024-02-01T00:00:08Z", "one"),
+    ])
+    comments, watermark = fetch_new_comments(youtube, VIDEO_ID)
+    assert texts(comments) == ["four", "three", "two", "one"]
+    assert comments[0]['published'] == "2024-02-01T00:00:10Z"
+    assert watermark == {'published': "2024-02-01T00:00:10Z", 'ids': ["c4", "c3"]}
+
+
+def test_comment_in_the_watermark_second_is_not_lost_or_repeated():
+    watermark = {'published': "2024-02-01T00:00:10Z", 'ids': ["c4", "c3"]}
+    youtube = FakeYouTube([
+        ("c6", "2024-02-01T00:00:11Z", "six"),
+        ("c5", "2024-02-01T00:00:10Z", "five"),
+        ("c4", "2024-02-01T00:00:10Z", "four"),
+        ("c3", "2024-02-01T00:00:10Z", "three"),
+        ("c2", "2024-02-01T00:00:09Z", "two"),
+        ("c1", "2024-02-01T00:00:08Z", "one"),
+    ])
+    comments, newest = fetch_new_comments(youtube, VIDEO_ID, watermark=watermark)
+    assert texts(comments) == ["six", "five"]
+    assert newest == {'published': "2024-02-01T00:00:11Z", 'ids': ["c6"]}
+    # Paging stopped at the first older comment
+    assert youtube.requests == 3
+
+
+def test_new_comments_in_the_watermark_second_extend_its_ids():
+    watermark = {'published': "2024-02-01T00:00:10Z", 'ids': ["c3"]}
+    youtube = FakeYouTube([
+        ("c4", "2024-02-01T00:00:10Z", "four"),
+        ("c3", "2024-02-01T00:00:10Z", "three"),
+        ("c2", "2024-02-01T00:00:09Z", "two"),
+    ])
+    comments, newest = fetch_new_comments(youtube, VIDEO_ID, watermark=watermark)
+    assert texts(comments) == ["four"]
+    assert newest == {'published': "2024-02-01T00:00:10Z", 'ids': ["c3", "c4"]}
+
+    comments, again = fetch_new_comments(youtube, VIDEO_ID, watermark=newest)
+    assert comments == []
+    assert again == newest
+
+
+def test_legacy_watermark_with_one_id():
+    watermark = {'published': "2024-02-01T00:00:10Z", 'id': "c3"}
+    youtube = FakeYouTube([
+        ("c4", "2024-02-01T00:00:10Z", "four"),
+        ("c3", "2024-02-01T00:00:10Z", "three"),
+    ])
+    comments, newest = fetch_new_comments(youtube, VIDEO_ID, watermark=watermark)
+    assert texts(comments) == ["four"]
+    assert newest == {'published': "2024-02-01T00:00:10Z", 'ids': ["c3", "c4"]}
+
+
+def write_table(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def test_watermark_seeded_from_the_export(tmp_path):
+    url = "https://www.youtube.com/watch?v=" + VIDEO_ID
+    # Tables written before the Published and Summarized At columns existed
+    write_table(tmp_path / "comments.csv", ["Title", "URL", "Comments", "Cluster"],
+                [["Video", url, "two", 0], ["Video", url, "one", 1], ["Other", url + "x", "three", 0]])
+    write_table(tmp_path / "summaries.csv", ["Title", "URL", "Comment Summary"],
+                [["Video", url, "old summary"], ["Video", url, "current summary"]])
+
+    exported = ExportedComments(str(tmp_path))
+    watermark = exported.watermark(VIDEO_ID)
+    assert watermark == {'texts': {"two", "one"}, 'clusters': 2, 'summary': "current summary"}
+    assert exported.watermark("unknown") == {'texts': set(), 'clusters': 0, 'summary': None}
+
+    youtube = FakeYouTube([
+        ("c3", "2024-02-01T00:00:10Z", "three"),
+        ("c2", "2024-02-01T00:00:09Z", "two"),
+        ("c1", "2024-02-01T00:00:08Z", "one"),
+    ])
+    comments, newest = fetch_new_comments(youtube, VIDEO_ID, watermark=watermark)
+    assert texts(comments) == ["three"]
+    # From now on the video has a real watermark
+    assert newest == {'published': "2024-02-01T00:00:10Z", 'ids': ["c3"]}